@@ -1,321 +1,90 @@
-import re
+import json
+import os
+import time
 import pandas as pd
 from io import BytesIO
 import streamlit as st
-from PyPDF2 import PdfReader
+from result_extract import iter_pdf_pages, spool_to_file
+from result_cache import get_default_cache, ledger_key
+from result_table import StudentTable
+from result_marks import compute_totals
+from result_validate import ANOMALY_COLUMNS, validate_students
+from result_analytics import cohort_analytics
+from result_export import (
+    EXPORT_FORMATS, SPLIT_COLUMN, export_bytes, export_columns, export_preview, select_subjects, write_split_zip,
+)
+from result_metrics import COUNTERS, PipelineStats, timed
+from result_jobs import CANCELLED, DONE, FAILED, QUEUED, get_job_queue
+# The parsing core, re-exported here for existing callers
+from result_parser import (
+    LedgerScanner, auto_detect_subjects, auto_detect_subjects_from_lines, clean_mark, finalize_student,
+    iter_lines, iter_students, new_student, parse_student_file_from_text, scan_ledger,
+)
 
 # ---------- Backend Functions ----------
 
-def clean_mark(token):
+def extract_text_from_pdf(pdf_bytes, workers=1):
     """
-    If token contains '/', return only the part before the slash.
-    Otherwise, return the token as is.
+    Extract text from a PDF file given as bytes (or as a file path, which is read on demand).
+    Set workers > 1 (or None for one per CPU) to extract large files on a process pool.
     """
-    if "/" in token:
-        return token.split("/")[0]
-    return token
+    return "".join(page_text + "\n" for page_text in iter_pdf_pages(pdf_bytes, workers))
 
-def extract_text_from_pdf(pdf_bytes):
+def preview_ledger(source, max_pages=None, stable_pages=None):
     """
-    Extract text from a PDF file given as bytes.
-    """
-    reader = PdfReader(BytesIO(pdf_bytes))
-    text = ""
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text
-
-def auto_detect_subjects(text):
-    """
-    Auto-detect subject base names from lines that start with a course code and contain a '*' token.
-    Returns a list of base subject names.
-    """
-    subjects = []
-    for line in text.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        if re.match(r"^\d", line) and "*" in line:
-            tokens = line.split()
-            try:
-                star_index = tokens.index("*")
-            except ValueError:
-                continue
-            subject = " ".join(tokens[1:star_index]).strip()
-            if subject and subject not in subjects:
-                subjects.append(subject)
-    return subjects
-
-def parse_student_file_from_text(text):
-    """
-    Parse the extracted text from the PDF and return a list of student dictionaries.
-    Student records are built dynamically by adding keys for each subject encountered.
+    Take a quick look at a PDF ledger (bytes or file path) without reading all of it.
+
+    Pages are read from the start until max_pages have been read or no new subject has
+    appeared for stable_pages pages in a row (once a student is complete). Returns
+    (detected subjects, StudentTable of the students completed so far, pages read).
     """
-    lines = text.splitlines()
+    max_pages = PREVIEW_MAX_PAGES if max_pages is None else max_pages
+    stable_pages = PREVIEW_STABLE_PAGES if stable_pages is None else stable_pages
+    scanner = LedgerScanner()
     students = []
-    current_student = None
-
-    def new_student():
-        return {
-            "Seat No.": "-",
-            "Name of Student": "-",
-            "Mother's Name": "-",
-            "PRN": "-",
-            "College Code": "-",
-            "SGPA": "-",
-            "Total Credits": "-",
-            "CGPA": "-",
-            "Total": "",
-            "%": ""
-        }
-
-    header_regex = re.compile(
-        r"SEAT NO\.\:\s*(\S+)\s*NAME\s*:\s*(.*?)\s*MOTHER\s*:\s*(.*?)\s*PRN\s*:\s*(\S+)\s*CLG\.\:\s*(\S+)"
-    )
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        if (line.startswith("COURSE NAME") or line.startswith("SEM.:") or 
-            line.startswith("............") or line.startswith("PAGE :-") or
-            line.startswith("COLLEGE:") or line.startswith("BRANCH CODE")):
-            continue
-
-        header_match = header_regex.search(line)
-        if header_match:
-            if current_student is not None:
-                current_student["CGPA"] = current_student["SGPA"]
-                
-                # Calculate total marks and percentage
-                total_marks = 0
-                max_marks = 0
-                for key, value in current_student.items():
-                    if key.endswith(" (Total)") and value not in ["-", "AB", "FF"]:
-                        try:
-                            total_marks += int(value)
-                            max_marks += 100  # Assuming each subject is out of 100
-                        except ValueError:
-                            pass
-                    elif (key.endswith(" (TW)") or key.endswith(" (PR)")) and value not in ["-", "AB", "FF"]:
-                        try:
-                            total_marks += int(value)
-                            max_marks += 50  # Assuming TW/PR are out of 50
-                        except ValueError:
-                            pass
-                
-                if max_marks > 0:
-                    current_student["Total"] = str(total_marks)
-                    current_student["%"] = str(round((total_marks / max_marks) * 100, 2))
-                
-                students.append(current_student)
-                
-            current_student = new_student()
-            current_student["Seat No."] = header_match.group(1)
-            current_student["Name of Student"] = header_match.group(2).strip()
-            current_student["Mother's Name"] = header_match.group(3).strip()
-            current_student["PRN"] = header_match.group(4).strip()
-            current_student["College Code"] = header_match.group(5).strip()
-            continue
-
-        if line.startswith("SGPA1 :"):
-            sgpa_match = re.search(r"SGPA1\s*:\s*([\d.]+|--)", line)
-            tc_match = re.search(r"TOTAL CREDITS EARNED\s*:\s*(\d+)", line)
-            if sgpa_match:
-                current_student["SGPA"] = sgpa_match.group(1)
-            if tc_match:
-                current_student["Total Credits"] = tc_match.group(1)
-            continue
-
-        if re.match(r"^\d", line) and "*" in line:
-            tokens = line.split()
-            try:
-                star_index = tokens.index("*")
-            except ValueError:
-                continue
-                
-            course_code = tokens[0]
-            base_subject = " ".join(tokens[1:star_index]).strip()
-            marks = tokens[star_index+1:]
-            
-            # Handle special cases like "AB", "FF", etc.
-            processed_marks = []
-            for mark in marks:
-                if mark in ["AB", "AB/070", "AB/050", "FF", "PP"]:
-                    processed_marks.append(mark.split("/")[0] if "/" in mark else mark)
-                else:
-                    processed_marks.append(clean_mark(mark))
-            
-            # Store course code as a separate field
-            current_student[base_subject + " (Code)"] = course_code
-            
-            if "LABORATORY PRACTICE" in base_subject.upper() or "PROJECT" in base_subject.upper():
-                # Fix for Lab Practice and Project subjects
-                tw_index = -1
-                pr_index = -1
-                
-                for i, token in enumerate(marks):
-                    if "TW" in token or token.endswith("/050"):
-                        tw_index = i
-                    elif "PR" in token or (i > tw_index and token.endswith("/050")):
-                        pr_index = i
-                
-                if tw_index >= 0 and tw_index < len(processed_marks):
-                    key_tw = base_subject + " (TW)"
-                    current_student[key_tw] = processed_marks[tw_index]
-                
-                if pr_index >= 0 and pr_index < len(processed_marks):
-                    key_pr = base_subject + " (PR)"
-                    current_student[key_pr] = processed_marks[pr_index]
-            elif "MOOC" in base_subject.upper():
-                # Handle MOOC subjects
-                if len(processed_marks) >= 1:
-                    for i, mark in enumerate(processed_marks):
-                        if mark in ["PP", "FF"]:
-                            key_mark = base_subject + " (Status)"
-                            current_student[key_mark] = mark
-            else:
-                # Regular subjects with ISE, ESE, and Total
-                ise_index = -1
-                ese_index = -1
-                total_index = -1
-                
-                for i, token in enumerate(marks):
-                    if i == 0 and ("ISE" in token or token.endswith("/030")):
-                        ise_index = i
-                    elif i == 1 and ("ESE" in token or token.endswith("/070")):
-                        ese_index = i
-                    elif i == 2 and token.endswith("/100"):
-                        total_index = i
-                
-                if ise_index >= 0 and ise_index < len(processed_marks):
-                    key_insem = base_subject + " (Insem)"
-                    current_student[key_insem] = processed_marks[ise_index]
-                
-                if ese_index >= 0 and ese_index < len(processed_marks):
-                    key_ese = base_subject + " (ESE)"
-                    current_student[key_ese] = processed_marks[ese_index]
-                
-                if total_index >= 0 and total_index < len(processed_marks):
-                    key_total = base_subject + " (Total)"
-                    current_student[key_total] = processed_marks[total_index]
-                
-                # Add grades information
-                grade_index = -1
-                gp_index = -1
-                cp_index = -1
-                
-                for i, token in enumerate(tokens):
-                    if token == "Grd" and i+1 < len(tokens):
-                        grade_index = i+1
-                    elif token == "GP" and i+1 < len(tokens):
-                        gp_index = i+1
-                    elif token == "CP" and i+1 < len(tokens):
-                        cp_index = i+1
-                
-                if grade_index >= 0 and grade_index < len(tokens):
-                    key_grade = base_subject + " (Grade)"
-                    current_student[key_grade] = tokens[grade_index]
-                
-                if gp_index >= 0 and gp_index < len(tokens):
-                    key_gp = base_subject + " (GP)"
-                    current_student[key_gp] = tokens[gp_index]
-                
-                if cp_index >= 0 and cp_index < len(tokens):
-                    key_cp = base_subject + " (CP)"
-                    current_student[key_cp] = tokens[cp_index]
-                
-                # Add Tot% column
-                tot_percent_index = -1
-                for i, token in enumerate(tokens):
-                    if token == "Tot%":
-                        tot_percent_index = i+1
-                        break
-                
-                if tot_percent_index >= 0 and tot_percent_index < len(tokens):
-                    key_tot_percent = base_subject + " (Tot%)"
-                    current_student[key_tot_percent] = tokens[tot_percent_index]
-
-    if current_student is not None:
-        current_student["CGPA"] = current_student["SGPA"]
-        
-        # Calculate total marks and percentage for the last student
-        total_marks = 0
-        max_marks = 0
-        for key, value in current_student.items():
-            if key.endswith(" (Total)") and value not in ["-", "AB", "FF"]:
-                try:
-                    total_marks += int(value)
-                    max_marks += 100  # Assuming each subject is out of 100
-                except ValueError:
-                    pass
-            elif (key.endswith(" (TW)") or key.endswith(" (PR)")) and value not in ["-", "AB", "FF"]:
-                try:
-                    total_marks += int(value)
-                    max_marks += 50  # Assuming TW/PR are out of 50
-                except ValueError:
-                    pass
-        
-        if max_marks > 0:
-            current_student["Total"] = str(total_marks)
-            current_student["%"] = str(round((total_marks / max_marks) * 100, 2))
-        
-        students.append(current_student)
-    
-    return students
+    pages_read = 0
+    unchanged = 0
+    pages = iter_pdf_pages(source, max_pages=max_pages)
+    try:
+        for page_text in pages:
+            pages_read += 1
+            known = len(scanner.subjects)
+            scanner.page = pages_read
+            students.extend(scanner.feed(page_text.splitlines()))
+            unchanged = unchanged + 1 if students and len(scanner.subjects) == known else 0
+            if unchanged >= stable_pages:
+                break
+    finally:
+        pages.close()
+    if not students:
+        # A single student that didn't close within the pages read
+        student = scanner.finish()
+        if student is not None:
+            students.append(student)
+    return scanner.subjects, compute_totals(StudentTable.from_records(students)), pages_read
+
+# Preview limits: read at most this many pages, and stop after this many pages without a new subject
+PREVIEW_MAX_PAGES = 10
+PREVIEW_STABLE_PAGES = 3
 
-def create_excel_in_memory(students, selected_subjects_str):
+# Columns an export can be split by
+SPLIT_OPTIONS = [SPLIT_COLUMN, "Result"]
+
+def create_excel_in_memory(students, selected_subjects_str, analytics=False):
     """
     Create an Excel file in memory (as bytes) using the student data.
+    students is a StudentTable or a list of student dictionaries.
     The selected_subjects_str is a comma-separated list of base subject names.
     Only dynamic keys from each student that match these base names will be included.
+    With analytics=True the cohort analytics sheets are added after the student sheet.
     """
-    common_cols = ["Seat No.", "Name of Student", "Mother's Name", "PRN", "College Code", 
-                  "SGPA", "Total Credits", "CGPA", "Total", "%"]
-    subject_keys = set()
-    for s in students:
-        for k in s.keys():
-            if k not in common_cols:
-                subject_keys.add(k)
-    
-    user_subjects = [x.strip() for x in selected_subjects_str.split(",") if x.strip()]
-    final_subject_cols = []
-    
-    # First, handle the user-selected subjects in order
-    for subj in user_subjects:
-        ordered_keys = []
-        # Order the columns: Code, Insem, ESE, Total, TW, PR, etc.
-        field_order = [" (Code)", " (Insem)", " (ESE)", " (Total)", " (TW)", " (PR)", " (Status)", 
-                      " (Tot%)", " (Grade)", " (GP)", " (CP)"]
-        
-        for field in field_order:
-            for key in subject_keys:
-                if key.upper().startswith(subj.upper()) and key.endswith(field):
-                    ordered_keys.append(key)
-        
-        for key in ordered_keys:
-            if key not in final_subject_cols:
-                final_subject_cols.append(key)
-    
-    # Add any remaining subject fields not covered by user selection
-    for key in sorted(subject_keys):
-        if key not in final_subject_cols:
-            final_subject_cols.append(key)
-    
-    final_cols = ["Sr.", "Seat No.", "Name of Student", "Mother's Name", "PRN", "College Code"] + final_subject_cols + ["SGPA", "Total Credits", "CGPA", "Total", "%"]
-    
-    rows = []
-    sr = 1
-    for s in students:
-        row = {"Sr.": sr}
-        for col in final_cols[1:]:
-            row[col] = s.get(col, "-")
-        rows.append(row)
-        sr += 1
+    if not isinstance(students, StudentTable):
+        students = StudentTable.from_records(students)
+
+    final_cols = export_columns(students, selected_subjects_str)
     
-    df = pd.DataFrame(rows, columns=final_cols)
+    df = students.to_dataframe(final_cols[1:])
+    df.insert(0, "Sr.", range(1, len(students) + 1))
     
     # Format the Excel file with proper column widths
     output = BytesIO()
@@ -327,6 +96,10 @@ def create_excel_in_memory(students, selected_subjects_str):
         for i, col in enumerate(df.columns):
             max_len = max(df[col].astype(str).map(len).max(), len(col)) + 2
             worksheet.set_column(i, i, min(max_len, 30))
+
+        if analytics:
+            for name, frame in cohort_analytics(students).items():
+                frame.to_excel(writer, index=False, sheet_name=name)
         
         # Add some basic formatting
         header_format = writer.book.add_format({'bold': True, 'bg_color': '#D9E1F2', 'border': 1})
@@ -336,11 +109,232 @@ def create_excel_in_memory(students, selected_subjects_str):
 
 # ---------- Multi-Page Streamlit App ----------
 
+# Students shown in the live preview of the export columns
+PREVIEW_ROWS = 20
+
+# Uploads at least this large are spooled to disk instead of being passed around as bytes
+SPOOL_MIN_BYTES = 8 * 1024 * 1024
+
+# How often a page showing a running job refreshes its progress
+POLL_SECONDS = 0.5
+
+# st.rerun is st.experimental_rerun before Streamlit 1.27
+rerun = getattr(st, "rerun", None) or st.experimental_rerun
+
+def read_pages(source, pages, workers=1, stats=None, progress=None):
+    """
+    Yield the texts of the pages of a PDF (bytes or file path) as they are extracted,
+    timed as the "extract" stage, and collect them in the list `pages` (e.g. for the cache).
+    progress(pages read) is called after each page.
+    """
+    for page_text in timed(iter_pdf_pages(source, workers, stats), stats, "extract"):
+        pages.append(page_text)
+        if progress is not None:
+            progress(len(pages))
+        yield page_text
+
+def process_ledger(job, source, workers=1):
+    """
+    Background job: extract and parse a PDF ledger (bytes or file path), reporting pages and
+    students to the job. Returns a dict with the cache key, detected subjects, StudentTable,
+    anomalies (see result_validate) and run statistics.
+    """
+    cache = get_default_cache()
+    key = ledger_key(source)
+    stats = PipelineStats()
+    counters = stats.counters
+
+    def report_pages(pages_read):
+        job.progress(pages_done=pages_read, page_count=counters["pages"])
+
+    def report_students(count):
+        job.progress(students=count)
+
+    # Detect subject base names and parse the students in the same pass. (Stored as "scan-page-index"
+    # since records keep the PDF page they start on: tables cached with other page numbers are
+    # parsed again, and so are page lists cached without their empty pages.)
+    scanned = cache.get(key, "scan-page-index")
+    if scanned is None:
+        pages = cache.get(key, "all-pages")
+        if pages is None:
+            # Each page is parsed while the next one is extracted; the per-page texts (not one
+            # concatenated document string) are kept for the cache as they go by
+            pages = []
+            scanned = scan_ledger(iter_lines(read_pages(source, pages, workers, stats, report_pages)),
+                                  stats, report_students)
+            cache.put(key, "all-pages", pages)
+        else:
+            job.progress(pages_done=len(pages), page_count=len(pages))
+            scanned = scan_ledger(iter_lines(pages), stats, report_students)
+        cache.put(key, "scan-page-index", scanned)
+    detected_subjects, students = scanned
+    job.progress(students=len(students))
+    return {
+        "key": key,
+        "subjects": detected_subjects,
+        "students": students,
+        "anomalies": validate_students(students, stats=stats),
+        "run_stats": update_run_stats(cache, key, stats),
+    }
+
+def export_ledger(job, ledger, selected_subjects_str, fmt, analytics=False, split_by=None, workers=1,
+                  only_selected=False):
+    """
+    Background job: export a parsed ledger and return the file as bytes.
+    With split_by, the result is a ZIP with one file per value of that column, written on
+    `workers` processes. With only_selected, the other subjects' columns are left out.
+    """
+    students = ledger["students"]
+    job.progress(students=len(students), message=f"Writing {fmt}")
+    stats = PipelineStats()
+    with stats.stage("export"):
+        if only_selected:
+            students = select_subjects(students, selected_subjects_str)
+        if split_by:
+            output = BytesIO()
+            write_split_zip(students, selected_subjects_str, output, split_by, fmt, workers, analytics)
+            output_bytes = output.getvalue()
+        else:
+            output_bytes = export_bytes(students, selected_subjects_str, fmt, analytics)
+    ledger["run_stats"] = update_run_stats(get_default_cache(), ledger["key"], stats)
+    return output_bytes
+
+def wait_for_job(job, label):
+    """
+    Return True once job has finished successfully. While it is queued or running, show its
+    progress and rerun the page after POLL_SECONDS; if it failed, show why and return False.
+    """
+    if job.state == DONE:
+        return True
+    if job.state == FAILED:
+        if isinstance(job.exception, ImportError):
+            st.error(f"This format needs an optional package that isn't installed: {job.exception}")
+        else:
+            st.error(f"{label} failed.")
+            st.code(job.error)
+        return False
+    if job.state == CANCELLED:
+        st.warning(f"{label} was cancelled.")
+        return False
+
+    if job.state == QUEUED:
+        queued, running = get_job_queue().active()
+        text = f"{label}: waiting for a free worker ({running} running, {queued} queued)"
+    else:
+        pages = f"{job.pages_done} of {job.page_count} pages" if job.page_count else "starting"
+        text = f"{label}: {pages}, {job.students} students ({job.elapsed():.0f}s)"
+    st.progress(job.fraction() or 0.0, text=text)
+    if st.button("Cancel", key=f"cancel-{job.id}"):
+        job.cancel()
+    time.sleep(POLL_SECONDS)
+    rerun()
+
+def show_preview(subjects, sample, pages_read):
+    """
+    Show the subjects and students found by preview_ledger.
+    """
+    if subjects:
+        st.info(f"Subjects detected in the first {pages_read} pages: **{', '.join(subjects)}**")
+    if len(sample):
+        st.caption(f"Sample of {min(len(sample), PREVIEW_ROWS)} students; the full ledger is still being read")
+        st.dataframe(export_preview(sample, ", ".join(subjects), PREVIEW_ROWS), hide_index=True)
+
+def load_ledger(uploaded_pdf, workers=1):
+    """
+    Return the parsed ledger of an upload as a dict with its cache key, detected subjects,
+    StudentTable and run statistics, or None while it is still being processed.
+
+    The ledger is read by a background job (see process_ledger); until it finishes, a
+    preview of its first pages (see preview_ledger) and the job's progress are shown and
+    the page polls. The result is kept in st.session_state, so the
+    reruns caused by editing the subjects, changing the format or downloading reuse it
+    without hashing, extracting or parsing the PDF again. A new upload replaces it; the
+    same PDF uploaded again is served from the cache.
+    """
+    upload_id = getattr(uploaded_pdf, "file_id", None) or (uploaded_pdf.name, uploaded_pdf.size)
+    ledger = st.session_state.get("ledger")
+    if ledger is not None and ledger["upload_id"] == upload_id:
+        return ledger
+
+    queue = get_job_queue()
+    job_ref = st.session_state.get("ledger_job")
+    job = queue.get(job_ref[1]) if job_ref is not None and job_ref[0] == upload_id else None
+    if job is None:
+        if job_ref is not None:
+            # The previous upload was replaced before it finished
+            previous = queue.get(job_ref[1])
+            if previous is not None and not previous.done:
+                previous.cancel()
+        if uploaded_pdf.size >= SPOOL_MIN_BYTES:
+            # Large uploads are copied to a temporary file that the job (and its extraction
+            # workers) read from, instead of passing copies of the bytes around
+            uploaded_pdf.seek(0)
+            source = path = spool_to_file(uploaded_pdf)
+            cleanup = lambda: os.remove(path)
+        else:
+            source = uploaded_pdf.getvalue()
+            cleanup = None
+        # Subjects and a sample from the first pages, shown while the whole file is read
+        st.session_state["ledger_preview"] = (upload_id,) + preview_ledger(source)
+        job = queue.submit("parse", process_ledger, source, workers, cleanup=cleanup)
+        st.session_state["ledger_job"] = (upload_id, job.id)
+
+    preview = st.session_state.get("ledger_preview")
+    if not job.done and preview is not None and preview[0] == upload_id:
+        show_preview(*preview[1:])
+
+    if not wait_for_job(job, "Reading the ledger"):
+        return None
+    ledger = dict(job.result, upload_id=upload_id)
+    st.session_state["ledger"] = ledger
+    return ledger
+
+def update_run_stats(cache, key, stats):
+    """
+    Merge the stages measured in this run into the statistics cached for the ledger, so a
+    rerun served from the cache still shows the numbers from when the ledger was processed.
+    """
+    cached = cache.get(key, "stats") or PipelineStats().to_dict()
+    measured = stats.to_dict()
+    run_stats = {
+        "stages": {**cached["stages"], **measured["stages"]},
+        "counters": {**cached["counters"], **{name: n for name, n in measured["counters"].items() if n}},
+    }
+    cache.put(key, "stats", run_stats)
+    return run_stats
+
+def show_run_stats(run_stats):
+    """
+    Sidebar panel with the time and memory of each stage and the parse-quality counters.
+    """
+    with st.sidebar.expander("Run statistics"):
+        if run_stats["stages"]:
+            stages = pd.DataFrame.from_dict(run_stats["stages"], orient="index").rename(columns={
+                "seconds": "Seconds", "calls": "Calls", "peak_rss_mb": "Peak RSS (MB)",
+                "rss_growth_mb": "RSS growth (MB)",
+            })
+            st.dataframe(stages)
+        counters = run_stats["counters"]
+        st.dataframe(pd.DataFrame({"Count": [counters.get(name, 0) for name in COUNTERS]}, index=COUNTERS))
+        dropped = counters.get("unmatched_course_lines", 0) + counters.get("orphan_lines", 0)
+        if dropped:
+            st.warning(f"{dropped} course/SGPA lines could not be attached to a student.")
+        st.download_button("Download as JSON", json.dumps(run_stats, indent=2),
+                           file_name="ledger_run_stats.json", mime="application/json")
+
 def main():
     st.set_page_config(page_title="Result Ledger Parser", layout="wide")
     
     # Sidebar for navigation
     page = st.sidebar.selectbox("Navigation", ["Home", "Contact", "Help"])
+    workers = st.sidebar.number_input(
+        "Extraction workers", min_value=1, max_value=os.cpu_count() or 1, value=os.cpu_count() or 1,
+        help="Large PDFs, and split exports, are spread across this many processes. "
+             "Small files are always read sequentially."
+    )
+    job_queue = get_job_queue()
+    queued, running = job_queue.active()
+    st.sidebar.caption(f"Background jobs: {running} running, {queued} queued (at most {job_queue.max_workers} at once)")
 
     if page == "Home":
         st.title("Dynamic Result Ledger Parser from PDF")
@@ -361,38 +355,83 @@ def main():
 
         uploaded_pdf = st.file_uploader("Choose a PDF file", type=["pdf"])
         
-        if uploaded_pdf is not None:
-            pdf_bytes = uploaded_pdf.getvalue()
-            extracted_text = extract_text_from_pdf(pdf_bytes)
-            
-            # Auto-detect subject base names
-            detected_subjects = auto_detect_subjects(extracted_text)
+        ledger = load_ledger(uploaded_pdf, workers) if uploaded_pdf is not None else None
+        if ledger is not None:
+            detected_subjects = ledger["subjects"]
+            students = ledger["students"]
             if detected_subjects:
                 detected_str = ", ".join(detected_subjects)
                 st.info(f"Auto-detected subject base names: **{detected_str}**")
             else:
                 st.warning("No subjects were automatically detected. Please enter subject base names manually.")
+
+            anomalies = ledger["anomalies"]
+            if anomalies:
+                with st.expander(f"{len(anomalies)} possible extraction errors (check these records against the PDF)"):
+                    st.dataframe(pd.DataFrame(anomalies, columns=ANOMALY_COLUMNS), hide_index=True)
+                    st.download_button("Download anomaly report (JSON)",
+                                       json.dumps({"anomalies": len(anomalies), "rows": anomalies}, indent=2),
+                                       file_name="ledger_anomalies.json", mime="application/json")
             
             default_subject_input = detected_str if detected_subjects else ""
             subject_names_input = st.text_input("Enter subject base names (comma separated)", default_subject_input)
+            only_selected = st.checkbox("Leave out the other subjects",
+                                        help="Export only the columns of the subjects entered above")
+
+            # Changing the subjects only reorders (or selects) the columns of the parsed dataset kept in the session
+            if students:
+                shown = select_subjects(students, subject_names_input) if only_selected else students
+                preview = export_preview(shown, subject_names_input, PREVIEW_ROWS)
+                st.caption(f"Preview: first {len(preview)} of {len(students)} students, {len(preview.columns)} columns")
+                st.dataframe(preview, hide_index=True)
             
             proceed = st.checkbox("Proceed with these subjects?")
+            output_format = st.selectbox(
+                "Output format", list(EXPORT_FORMATS),
+                format_func=lambda fmt: {"xlsx": "Excel (.xlsx)", "csv": "CSV (.csv)",
+                                         "parquet": "Parquet (.parquet)", "arrow": "Arrow IPC (.arrow)"}[fmt]
+            )
+            # Pass rates, grade distribution, toppers and college averages as extra sheets
+            analytics = output_format == "xlsx" and st.checkbox("Include analytics sheets")
+            # One file per college (or result), bundled as a ZIP
+            split_by = st.selectbox("Split into one file per", [None] + SPLIT_OPTIONS,
+                                    format_func=lambda column: "Don't split" if column is None else column)
             
             if proceed:
+                export_settings = (ledger["upload_id"], subject_names_input, output_format, analytics, split_by,
+                                   only_selected)
                 if st.button("Generate Excel"):
-                    with st.spinner("Processing PDF and generating Excel..."):
-                        students = parse_student_file_from_text(extracted_text)
-                        if students:
-                            st.success(f"Successfully extracted data for {len(students)} students.")
-                            excel_bytes = create_excel_in_memory(students, subject_names_input)
-                            st.download_button(
-                                label="Download Excel File",
-                                data=excel_bytes,
-                                file_name="result_ledger_output.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                            )
-                        else:
-                            st.error("No student data was extracted. Please check if the PDF format is correct.")
+                    if students:
+                        job = get_job_queue().submit("export", export_ledger, ledger, subject_names_input,
+                                                     output_format, analytics, split_by, workers, only_selected)
+                        st.session_state["export_job"] = (export_settings, job.id)
+                    else:
+                        st.error("No student data was extracted. Please check if the PDF format is correct.")
+
+                # The export runs in the background; the page polls until it can offer the download
+                job_ref = st.session_state.get("export_job")
+                if job_ref is not None and job_ref[0] == export_settings:
+                    job = get_job_queue().get(job_ref[1])
+                    if job is None or job.done:
+                        del st.session_state["export_job"]
+                    if job is not None and wait_for_job(job, "Generating the export"):
+                        ledger["export"] = (export_settings, job.result)
+
+                # The last export stays downloadable across reruns until the subjects or format change
+                export = ledger.get("export")
+                if export is not None and export[0] == export_settings:
+                    st.success(f"Successfully extracted data for {len(students)} students.")
+                    extension, mime, _ = EXPORT_FORMATS[output_format]
+                    if split_by:
+                        extension, mime = ".zip", "application/zip"
+                    st.download_button(
+                        label=f"Download {extension} File",
+                        data=export[1],
+                        file_name="result_ledger_output" + extension,
+                        mime=mime
+                    )
+
+            show_run_stats(ledger["run_stats"])
 
     elif page == "Contact":
         st.title("Contact Information")
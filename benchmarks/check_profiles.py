@@ -0,0 +1,101 @@
+import argparse
+import os
+import random
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from result_metrics import PipelineStats
+from result_parser import iter_lines, scan_ledger
+from result_profiles import ProfileStore
+from synthetic_ledger import PATTERNS, iter_ledger_pages
+
+# Share of course lines given an irregular shape, which the learned profile must not read
+IRREGULAR_RATE = 0.02
+
+def _irregular(rng, line):
+    """
+    Return a course line changed the way real ledgers vary: a token dropped or added, two
+    tokens swapped (e.g. a label and its value), a token printed in place of the next one
+    (e.g. a label twice) or a mark without its maximum. Only tokens after "*" change, so the
+    ledger keeps its fingerprint; the last three keep the token count.
+    """
+    tokens = line.split()
+    star = tokens.index("*")
+    if len(tokens) - star < 3:
+        return line
+    position = rng.randrange(star + 1, len(tokens) - 1)
+    change = rng.randrange(5)
+    if change == 0:
+        del tokens[position]
+    elif change == 1:
+        tokens.insert(position, "-")
+    elif change == 2:
+        tokens[position], tokens[position + 1] = tokens[position + 1], tokens[position]
+    elif change == 3:
+        tokens[position + 1] = tokens[position]
+    else:
+        tokens[position] = tokens[position].partition("/")[0]
+    return " ".join(tokens)
+
+def ledger_pages(students, seed, irregular_rate=0.0):
+    """
+    Return the page texts of a synthetic ledger cycling through every pattern, with
+    irregular_rate of its course lines made irregular.
+    """
+    rng = random.Random(seed)
+    pages = []
+    for page in iter_ledger_pages(students, seed, list(PATTERNS)):
+        lines = [_irregular(rng, line) if line[:1].isdecimal() and " * " in line and rng.random() < irregular_rate
+                 else line for line in page]
+        pages.append("\n".join(lines) + "\n")
+    return pages
+
+def compare(students, seed):
+    """
+    Read one irregular ledger with the heuristics and with the profile learned from its
+    regular version. Return (differences, profiled course lines, course lines).
+    """
+    learned = ProfileStore()
+    scan_ledger(iter_lines(ledger_pages(students, seed)), profiles=learned)
+    pages = ledger_pages(students, seed, IRREGULAR_RATE)
+
+    subjects, heuristic = scan_ledger(iter_lines(pages), profiles=ProfileStore())
+    stats = PipelineStats()
+    profiled_subjects, profiled = scan_ledger(iter_lines(pages), stats, profiles=learned)
+
+    differences = []
+    if profiled_subjects != subjects:
+        differences.append("detected subjects differ")
+    if profiled.columns != heuristic.columns:
+        differences.append("columns differ")
+    for row, (expected, got) in enumerate(zip(heuristic.records(), profiled.records())):
+        if got != expected or got.max_marks != expected.max_marks or got.page != expected.page:
+            differences.append(f"student {row} ({expected['Seat No.']}) differs")
+    if len(profiled) != len(heuristic):
+        differences.append(f"{len(profiled)} students instead of {len(heuristic)}")
+    counters = stats.counters
+    return differences, counters["profiled_course_lines"], counters["course_lines"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check that ledgers read with a learned layout profile give the same records as the heuristics.")
+    parser.add_argument("--students", type=int, default=1000, help="students per ledger (250 per college)")
+    parser.add_argument("--seeds", type=int, default=3, help="number of ledgers to generate")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for seed in range(args.seeds):
+        differences, profiled, course_lines = compare(args.students, seed)
+        print(f"seed {seed}: {profiled} of {course_lines} course lines read by the profile, "
+              f"{len(differences)} differences")
+        if not 0 < profiled < course_lines:
+            failures.append(f"seed {seed}: the profile read {profiled} of {course_lines} course lines")
+        failures.extend(f"seed {seed}: {difference}" for difference in differences)
+    for message in failures[:20]:
+        print("MISMATCH " + message, file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
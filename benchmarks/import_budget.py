@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Import-time budget (milliseconds) of the modules CLI runs and worker processes start with
+BUDGETS_MS = {
+    "result_parser": 30,
+    "result_extract": 80,
+    "result_store": 60,
+    "result_incremental": 120,
+    "result_cli": 150,
+}
+
+# Dependencies these modules must only load when they are used (for an export, a PDF, ...)
+HEAVY_MODULES = ["pandas", "numpy", "PyPDF2", "xlsxwriter", "pyarrow", "streamlit"]
+
+def measure_import(module):
+    """
+    Import module in a fresh interpreter and return (milliseconds, heavy modules it loaded).
+    The time is the cumulative import time reported by python -X importtime, so interpreter
+    startup isn't counted.
+    """
+    code = (f"import sys, json; import {module}; "
+            f"print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    microseconds = None
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            microseconds = int(parts[1])
+    return microseconds / 1000, json.loads(completed.stdout)
+
+def check_budgets(repeat=3, tolerance=1.0, progress=sys.stdout):
+    """
+    Import each module of BUDGETS_MS `repeat` times and return a list of messages for those
+    over their budget (times `tolerance`) or loading a heavy dependency.
+    """
+    failures = []
+    for module, budget in BUDGETS_MS.items():
+        results = [measure_import(module) for _ in range(repeat)]
+        milliseconds = min(result[0] for result in results)
+        heavy = results[0][1]
+        limit = budget * tolerance
+        print(f"{module:20} {milliseconds:7.1f} ms (budget {limit:.0f} ms)"
+              + (f"  loads {', '.join(heavy)}" if heavy else ""), file=progress, flush=True)
+        if milliseconds > limit:
+            failures.append(f"{module} imports in {milliseconds:.1f} ms, over its {limit:.0f} ms budget")
+        if heavy:
+            failures.append(f"{module} loads {', '.join(heavy)} at import time")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check that the headless modules import quickly and without heavy dependencies.")
+    parser.add_argument("--repeat", type=int, default=3, help="imports per module; the best time counts")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="multiply every budget by this factor")
+    args = parser.parse_args(argv)
+
+    failures = check_budgets(args.repeat, args.tolerance)
+    for message in failures:
+        print("OVER BUDGET " + message, file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from app import auto_detect_subjects, create_excel_in_memory, extract_text_from_pdf, parse_student_file_from_text
+from import_budget import check_budgets
+from result_export import create_excel_streaming
+from result_extract import get_extractor, iter_pdf_pages
+from result_table import StudentTable
+from synthetic_ledger import iter_ledger_pages, write_pdf
+
+SIZES = [100, 1000, 10000, 50000]
+BASELINES_PATH = os.path.join(HERE, "baselines.json")
+
+# A result regresses when it is slower / larger than its baseline by more than these factors
+TIME_TOLERANCE = 1.5
+MEMORY_TOLERANCE = 1.2
+
+def ledger_pdf(students, data_dir):
+    """
+    Return the path of the synthetic PDF ledger with this many students, generating it once.
+    """
+    path = os.path.join(data_dir, f"ledger_{students}.pdf")
+    if not os.path.exists(path):
+        with open(path + ".tmp", "wb") as f:
+            write_pdf(iter_ledger_pages(students), f)
+        os.replace(path + ".tmp", path)
+    return path
+
+def measure(function, repeat):
+    """
+    Run function() `repeat` times for the best wall time, then once more under tracemalloc
+    for its peak memory. Returns (result, seconds, peak MB).
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        del result
+    tracemalloc.start()
+    try:
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak / (1024 * 1024)
+
+def run(sizes, repeat, data_dir, skip_extract=False, progress=sys.stderr):
+    """
+    Benchmark each stage for each ledger size and return {"stage@size": {"seconds", "peak_mb"}}.
+    """
+    results = {}
+
+    def record(stage, size, seconds, peak_mb):
+        results[f"{stage}@{size}"] = {"seconds": round(seconds, 4), "peak_mb": round(peak_mb, 2)}
+        print(f"{stage:>30} {size:>6} students {seconds:9.3f}s {peak_mb:9.1f} MB", file=progress, flush=True)
+
+    for size in sizes:
+        pdf_path = ledger_pdf(size, data_dir)
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+
+        # Calibrating the "auto" PDF backend and importing it are once-per-process costs, kept
+        # out of the timings (extraction is timed once per size)
+        get_extractor(source=pdf_bytes)
+        list(iter_pdf_pages(pdf_bytes, max_pages=1))
+        if skip_extract:
+            text = extract_text_from_pdf(pdf_bytes)
+        else:
+            text, seconds, peak = measure(lambda: extract_text_from_pdf(pdf_bytes), 1)
+            record("extract_text_from_pdf", size, seconds, peak)
+
+        subjects, seconds, peak = measure(lambda: auto_detect_subjects(text), repeat)
+        record("auto_detect_subjects", size, seconds, peak)
+
+        students, seconds, peak = measure(lambda: parse_student_file_from_text(text), repeat)
+        record("parse_student_file_from_text", size, seconds, peak)
+
+        selected = ", ".join(subjects)
+        _, seconds, peak = measure(lambda: create_excel_in_memory(students, selected), 1)
+        record("create_excel_in_memory", size, seconds, peak)
+
+        # The writer the app and the command line use, on the StudentTable they keep
+        table = StudentTable.from_records(students)
+        _, seconds, peak = measure(lambda: create_excel_streaming(table, selected), 1)
+        record("create_excel_streaming", size, seconds, peak)
+    return results
+
+def find_regressions(results, baselines, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Return a list of messages for results that are worse than their stored baseline.
+    """
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            continue
+        if result["seconds"] > baseline["seconds"] * time_tolerance:
+            regressions.append(f"{key}: {result['seconds']:.3f}s vs baseline {baseline['seconds']:.3f}s")
+        if result["peak_mb"] > baseline["peak_mb"] * memory_tolerance:
+            regressions.append(f"{key}: {result['peak_mb']:.1f} MB vs baseline {baseline['peak_mb']:.1f} MB")
+    return regressions
+
+def load_baselines(path=BASELINES_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and measure each stage of the ledger pipeline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="ledger sizes in students")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per fast stage; the best time counts")
+    parser.add_argument("--data-dir", help="where generated ledgers are kept (default: a temporary directory)")
+    parser.add_argument("--skip-extract", action="store_true", help="don't time PDF text extraction")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument("--import-tolerance", type=float, default=1.0,
+                        help="multiply every import budget (see import_budget.py) by this factor")
+    parser.add_argument("--skip-import-budget", action="store_true", help="don't check the import budgets")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="store these results as the new baselines instead of checking them")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        results = run(args.sizes, args.repeat, args.data_dir, args.skip_extract)
+    else:
+        with tempfile.TemporaryDirectory() as data_dir:
+            results = run(args.sizes, args.repeat, data_dir, args.skip_extract)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baselines = load_baselines()
+    if args.update_baselines:
+        baselines.update(results)
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(baselines.items())), f, indent=2)
+            f.write("\n")
+        print(f"Updated {BASELINES_PATH}", file=sys.stderr)
+        return 0
+
+    regressions = find_regressions(results, baselines, args.time_tolerance, args.memory_tolerance)
+    if not args.skip_import_budget:
+        regressions.extend(check_budgets(tolerance=args.import_tolerance, progress=sys.stderr))
+    for message in regressions:
+        print("REGRESSION " + message, file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import argparse
+import random
+import sys
+
+# Lines per ledger page; every page starts with the university's page header block
+PAGE_LINES = 60
+
+# Subject mixes of the generated colleges: (course code, course name, kind)
+# kind is "theory" (ISE/ESE/Total), "lab" (tagged TW/PR), "tw" (TW only) or "mooc" (PP/FF)
+PATTERNS = {
+    "BE-IT-2019": [
+        ("410241", "DESIGN & ANALYSIS OF ALGO.", "theory"),
+        ("410242", "MACHINE LEARNING", "theory"),
+        ("410243", "BLOCKCHAIN TECHNOLOGY", "theory"),
+        ("410244D", "OBJ. ORIENTED MODL. & DESG.", "theory"),
+        ("410245D", "SOFT. TEST. & QLTY ASSURANCE", "theory"),
+        ("410246", "LABORATORY PRACTICE - III", "lab"),
+        ("410247", "LABORATORY PRACTICE - IV", "tw"),
+        ("410248", "PROJECT STAGE - I", "tw"),
+        ("410249", "MOOC - LEARN NEW SKILLS", "mooc"),
+    ],
+    "TE-COMP-2019": [
+        ("310241", "DATABASE MANAGEMENT SYSTEMS", "theory"),
+        ("310242", "THEORY OF COMPUTATION", "theory"),
+        ("310243", "SYSTEMS PROG. & OPER. SYSTEM", "theory"),
+        ("310244", "COMPUTER NETWORKS & SECURITY", "theory"),
+        ("310245C", "HUMAN COMPUTER INTERFACE", "theory"),
+        ("310246", "LABORATORY PRACTICE - I", "lab"),
+        ("310247", "LABORATORY PRACTICE - II", "lab"),
+        ("310249", "MOOC - SEMINAR & TECH. COMM.", "mooc"),
+    ],
+    "SE-ENTC-2019": [
+        ("204181", "ELECTRONIC CIRCUITS", "theory"),
+        ("204182", "DIGITAL CIRCUITS", "theory"),
+        ("204183", "ELECTRICAL CIRCUITS", "theory"),
+        ("204184", "DATA STRUC. & ALGORITHMS", "theory"),
+        ("207005", "ENGINEERING MATHEMATICS III", "theory"),
+        ("204185", "LABORATORY PRACTICE - EC", "lab"),
+        ("204187", "PROJECT BASED LEARNING", "tw"),
+    ],
+}
+
+GRADES = [("O", 10), ("A+", 9), ("A", 8), ("B+", 7), ("B", 6), ("C", 5), ("P", 4), ("F", 0)]
+FIRST_NAMES = ["AARAV", "ADITI", "ANIKET", "ISHA", "KUNAL", "MEERA", "NIKHIL", "PRIYA", "ROHAN", "SNEHA"]
+SURNAMES = ["BARI", "DESHMUKH", "JOSHI", "KULKARNI", "PATIL", "PAWAR", "SHINDE", "WAGH"]
+MOTHERS = ["ASHA", "LATA", "MANISHA", "SUNITA", "VAISHALI"]
+
+STUDENTS_PER_COLLEGE = 250
+
+# Share of lab lines printed with plain "033/050 017/050" marks (TW then PR) instead of tagged ones
+UNTAGGED_LAB_RATE = 0.3
+
+def _mark(rng, maximum, absent_rate=0.02, fail_rate=0.03):
+    roll = rng.random()
+    if roll < absent_rate:
+        return f"AB/{maximum:03d}" if rng.random() < 0.5 else "AB"
+    if roll < absent_rate + fail_rate:
+        return "FF"
+    return f"{rng.randint(maximum // 4, maximum):03d}/{maximum:03d}"
+
+def _total(insem, ese):
+    """
+    The Total printed with an ISE and an ESE mark: their sum, or the ESE's AB/FF code.
+    """
+    parts = [mark.partition("/")[0] for mark in (insem, ese)]
+    if all(part.isdecimal() for part in parts):
+        return f"{int(parts[0]) + int(parts[1]):03d}/100"
+    return "AB" if parts[1] == "AB" else "FF"
+
+def _tagged(mark, maximum, tag):
+    """
+    A lab mark tagged with its column ("045/050TW"); other lab lines print plain marks in
+    TW, PR order (see UNTAGGED_LAB_RATE).
+    """
+    if "/" not in mark:
+        mark = f"{mark}/{maximum:03d}"
+    return mark + tag
+
+def _course_line(rng, code, name, kind, untagged_lab_rate=UNTAGGED_LAB_RATE):
+    credits = 3 if kind == "theory" else 2
+    grade, gp = rng.choice(GRADES)
+    tail = f"Tot% {rng.randint(25, 100)} Crd {credits:02d} Grd {grade} GP {gp:02d} CP {gp * credits:02d}"
+    if kind == "theory":
+        insem = _mark(rng, 30)
+        ese = _mark(rng, 70)
+        return f"{code} {name} * {insem} {ese} {_total(insem, ese)} {tail}"
+    if kind == "lab":
+        tw, pr = _mark(rng, 50), _mark(rng, 50)
+        if rng.random() < untagged_lab_rate:
+            return f"{code} {name} * {tw} {pr} {tail}"
+        return f"{code} {name} * {_tagged(tw, 50, 'TW')} {_tagged(pr, 50, 'PR')} {tail}"
+    if kind == "tw":
+        return f"{code} {name} * {_mark(rng, 50)} {tail}"
+    return f"{code} {name} * {'FF' if rng.random() < 0.05 else 'PP'}"
+
+def _student_lines(rng, number, college, pattern, untagged_lab_rate=UNTAGGED_LAB_RATE):
+    first = rng.choice(FIRST_NAMES)
+    surname = rng.choice(SURNAMES)
+    lines = [
+        f"SEAT NO.: B{190000000 + number} NAME : {surname} {first} {rng.choice(FIRST_NAMES)} "
+        f"MOTHER : {rng.choice(MOTHERS)} PRN : 7{2010000 + number:08d}{rng.choice('ABCDEFGHJK')} CLG.: {college}",
+        "SEM.:1",
+    ]
+    for code, name, kind in PATTERNS[pattern]:
+        lines.append(_course_line(rng, code, name, kind, untagged_lab_rate))
+    sgpa = "--" if rng.random() < 0.05 else f"{rng.uniform(4, 10):.2f}"
+    lines.append(f"SGPA1 : {sgpa} TOTAL CREDITS EARNED : {rng.randint(0, 22)}")
+    return lines
+
+def _page_header(page, college, pattern):
+    return [
+        "SAVITRIBAI PHULE PUNE UNIVERSITY - RESULT LEDGER",
+        f"COLLEGE: [{college}] - SYNTHETIC COLLEGE OF ENGINEERING, PUNE",
+        f"BRANCH CODE: {pattern}",
+        f"PAGE :- {page}",
+        "." * 60,
+        "COURSE NAME ISE ESE TOTAL TW PR OR TUT Tot% Crd Grd GP CP",
+    ]
+
+def iter_ledger_pages(students, seed=0, patterns=None, untagged_lab_rate=UNTAGGED_LAB_RATE):
+    """
+    Yield the pages (lists of lines) of a synthetic SPPU ledger with `students` students.
+    Colleges of STUDENTS_PER_COLLEGE students cycle through `patterns` (default: all of
+    PATTERNS), and records run across page breaks like they do in real ledgers.
+    untagged_lab_rate of the lab lines have plain, untagged TW and PR marks.
+    """
+    rng = random.Random(seed)
+    patterns = list(patterns or PATTERNS)
+    page_number = 1
+    college, pattern = None, None
+    page = []
+    for number in range(students):
+        if number % STUDENTS_PER_COLLEGE == 0:
+            college_index = number // STUDENTS_PER_COLLEGE
+            college = f"CEGP{10500 + college_index:06d}"
+            pattern = patterns[college_index % len(patterns)]
+        for line in _student_lines(rng, number, college, pattern, untagged_lab_rate):
+            if not page:
+                page = _page_header(page_number, college, pattern)
+            page.append(line)
+            if len(page) >= PAGE_LINES:
+                yield page
+                page_number += 1
+                page = []
+    if page:
+        yield page
+
+def ledger_text(students, seed=0, patterns=None, untagged_lab_rate=UNTAGGED_LAB_RATE):
+    """
+    Return a synthetic ledger as the text extract_text_from_pdf would produce for it.
+    """
+    pages = iter_ledger_pages(students, seed, patterns, untagged_lab_rate)
+    return "".join("\n".join(page) + "\n" for page in pages)
+
+def _pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(pages, output):
+    """
+    Render pages (lists of text lines) as a plain Courier PDF, written incrementally to a binary file.
+    """
+    offsets = {}
+    position = 0
+
+    def emit(data):
+        nonlocal position
+        output.write(data)
+        position += len(data)
+
+    def emit_object(number, body):
+        offsets[number] = position
+        emit(f"{number} 0 obj\n".encode("latin-1") + body + b"\nendobj\n")
+
+    emit(b"%PDF-1.4\n")
+    emit_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>")
+    page_numbers = []
+    number = 4
+    for page in pages:
+        content = "BT /F1 7 Tf 9 TL 20 820 Td\n" + "T*\n".join(f"({_pdf_escape(line)}) Tj\n" for line in page) + "ET"
+        content = content.encode("latin-1", "replace")
+        emit_object(number, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        emit_object(number + 1, (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                                 b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % number))
+        page_numbers.append(number + 1)
+        number += 2
+    kids = " ".join(f"{n} 0 R" for n in page_numbers)
+    emit_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_numbers)} >>".encode("latin-1"))
+    emit_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    xref_position = position
+    emit(f"xref\n0 {number}\n0000000000 65535 f \n".encode("latin-1"))
+    for n in range(1, number):
+        emit(f"{offsets[n]:010d} 00000 n \n".encode("latin-1"))
+    emit(f"trailer\n<< /Size {number} /Root 1 0 R >>\nstartxref\n{xref_position}\n%%EOF\n".encode("latin-1"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic SPPU result ledger.")
+    parser.add_argument("students", type=int, help="number of students")
+    parser.add_argument("-o", "--output", required=True, help="output file (.txt or .pdf)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--patterns", nargs="+", choices=list(PATTERNS), help="subject mixes to use")
+    parser.add_argument("--untagged-lab-rate", type=float, default=UNTAGGED_LAB_RATE,
+                        help="share of lab lines with untagged TW and PR marks")
+    args = parser.parse_args(argv)
+
+    pages = iter_ledger_pages(args.students, args.seed, args.patterns, args.untagged_lab_rate)
+    if args.output.lower().endswith(".pdf"):
+        with open(args.output, "wb") as f:
+            write_pdf(pages, f)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for page in pages:
+                f.write("\n".join(page) + "\n")
+    print(f"Wrote {args.students} students to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
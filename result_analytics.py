@@ -0,0 +1,120 @@
+import numpy as np
+from result_marks import COUNTED_FIELDS, FAIL_CODES, PASS_FRACTION, field_of, max_marks, numeric_marks
+from result_table import StudentTable
+
+# Students listed on the Toppers sheet (more when several share the last place)
+TOPPERS = 10
+
+# SPPU grades from best to worst; any other grade found is listed after these
+GRADE_ORDER = ["O", "A+", "A", "B+", "B", "C", "P", "D", "F", "AB", "FF"]
+
+def _subject_marks(students):
+    """
+    Return one long DataFrame of every counted mark (Total, TW, PR) a student appeared for:
+    Subject, Field, Mark, Max, Absent and Passed, built column by column from the table.
+    """
+    import pandas as pd
+    parts = []
+    for column in students.columns:
+        field = field_of(column)
+        default = COUNTED_FIELDS.get(field)
+        if default is None:
+            continue
+        raw = np.asarray(students.column(column), dtype=object)
+        marks = numeric_marks(raw)
+        maxima = max_marks(students, column, default)
+        codes = np.isin(raw, FAIL_CODES)
+        appeared = ~np.isnan(marks) | codes
+        parts.append(pd.DataFrame({
+            "Subject": column[:-len(field)],
+            "Field": field.strip(" ()"),
+            "Mark": marks[appeared],
+            "Max": maxima[appeared],
+            "Absent": (raw == "AB")[appeared],
+            "Passed": (~codes & (marks >= PASS_FRACTION * maxima))[appeared],
+        }))
+    if not parts:
+        return pd.DataFrame(columns=["Subject", "Field", "Mark", "Max", "Absent", "Passed"])
+    return pd.concat(parts, ignore_index=True)
+
+def pass_rates(students):
+    """
+    Per subject and counted field: students appeared, passed, failed and absent, the pass
+    percentage (same pass mark as result_marks.compute_totals), and the average and highest mark.
+    """
+    marks = _subject_marks(students)
+    table = marks.groupby(["Subject", "Field"], sort=False).agg(
+        Appeared=("Passed", "size"), Passed=("Passed", "sum"), Absent=("Absent", "sum"),
+        Average=("Mark", "mean"), Highest=("Mark", "max"),
+    )
+    table.insert(2, "Failed", table["Appeared"] - table["Passed"])
+    table.insert(4, "Pass %", (100 * table["Passed"] / table["Appeared"]).round(2))
+    table["Average"] = table["Average"].round(2)
+    return table.reset_index()
+
+def grade_distribution(students):
+    """
+    Students per grade for every subject with a (Grade) column, grades best first.
+    """
+    import pandas as pd
+    subjects = []
+    grades = []
+    for column in students.columns:
+        if not column.endswith(" (Grade)"):
+            continue
+        values = [value for value in students.column(column) if value not in (None, "-", "")]
+        subjects.extend([column[:-len(" (Grade)")]] * len(values))
+        grades.extend(values)
+    if not grades:
+        return pd.DataFrame(columns=["Subject"])
+    counts = pd.crosstab(pd.Series(subjects, name="Subject"), pd.Series(grades, name="Grade"))
+    order = [grade for grade in GRADE_ORDER if grade in counts.columns]
+    order += sorted(grade for grade in counts.columns if grade not in GRADE_ORDER)
+    counts = counts.reindex(index=list(dict.fromkeys(subjects)), columns=order)
+    counts["Total"] = counts.sum(axis=1)
+    counts.columns.name = None
+    return counts.reset_index()
+
+def _student_frame(students):
+    import pandas as pd
+    frame = pd.DataFrame({name: students.column(name, "-")
+                          for name in ("Seat No.", "Name of Student", "PRN", "College Code", "Result")})
+    frame["SGPA"] = numeric_marks(students.column("SGPA"))
+    frame["%"] = numeric_marks(students.column("%"))
+    return frame
+
+def toppers(students, count=TOPPERS):
+    """
+    The students with the highest SGPA (ties share a rank; % breaks ties in the ordering).
+    """
+    frame = _student_frame(students).dropna(subset=["SGPA"])
+    frame.insert(0, "Rank", frame["SGPA"].rank(method="min", ascending=False).astype(int))
+    frame = frame[frame["Rank"] <= count].sort_values(["Rank", "%"], ascending=[True, False], kind="stable")
+    return frame[["Rank", "Seat No.", "Name of Student", "PRN", "College Code", "SGPA", "%", "Result"]]
+
+def college_averages(students):
+    """
+    Per college code: students, pass percentage, average and highest SGPA, and average %.
+    """
+    frame = _student_frame(students)
+    frame["Passed"] = frame["Result"] == "PASS"
+    table = frame.groupby("College Code").agg(
+        Students=("Seat No.", "size"), Passed=("Passed", "sum"),
+        **{"Average SGPA": ("SGPA", "mean"), "Highest SGPA": ("SGPA", "max"), "Average %": ("%", "mean")},
+    )
+    table.insert(2, "Pass %", (100 * table["Passed"] / table["Students"]).round(2))
+    return table.round(2).reset_index()
+
+def cohort_analytics(students):
+    """
+    Return the analytics sheets of a cohort as {sheet name: DataFrame}, in workbook order.
+    students is a StudentTable (with Total, % and Result computed) or a list of student dictionaries.
+    """
+    if not isinstance(students, StudentTable):
+        students = StudentTable.from_records(students)
+    return {
+        "Pass Rates": pass_rates(students),
+        "Grade Distribution": grade_distribution(students),
+        "Toppers": toppers(students),
+        "College Averages": college_averages(students),
+    }
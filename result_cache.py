@@ -0,0 +1,193 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Environment settings for the shared cache used by the app
+CACHE_DIR_ENV = "LEDGER_CACHE_DIR"
+CACHE_MAX_MB_ENV = "LEDGER_CACHE_MAX_MB"
+CACHE_MEMORY_MB_ENV = "LEDGER_CACHE_MEMORY_MB"
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+# Chunk size for hashing ledgers given as files
+HASH_CHUNK_BYTES = 1024 * 1024
+
+def ledger_key(source):
+    """
+    Return the cache key of a ledger: the SHA-256 hex digest of its PDF bytes.
+    source is the bytes or a file path; files are hashed in chunks without being read whole.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class LedgerCache:
+    """
+    Two-level cache for per-ledger results (page texts, detected subjects, parsed students).
+
+    Entries are addressed by (key, kind), where key is ledger_key() of the PDF.
+    The first level is an in-process LRU holding at most max_entries values whose pickled
+    sizes add up to at most max_memory_bytes (a value larger than that isn't kept in memory).
+    If cache_dir is given, values are also pickled to disk and the directory is trimmed,
+    oldest access first, whenever it grows beyond max_disk_bytes.
+
+    Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries=32, cache_dir=None, max_disk_bytes=512 * 1024 * 1024,
+                 max_memory_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        # (key, kind) -> (value, pickled size in bytes)
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key, kind, default=None):
+        with self._lock:
+            if (key, kind) in self._memory:
+                self._memory.move_to_end((key, kind))
+                return self._memory[(key, kind)][0]
+
+        data = self._read_disk(key, kind)
+        if data is None:
+            return default
+        try:
+            value = pickle.loads(data)
+        except (pickle.UnpicklingError, EOFError):
+            return default
+        self._remember(key, kind, value, len(data))
+        return value
+
+    def put(self, key, kind, value):
+        # The pickled size is what the memory budget counts, and the same bytes go to disk
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, kind, value, len(data))
+        self._write_disk(key, kind, data)
+
+    def get_or_compute(self, key, kind, compute):
+        """
+        Return the cached value for (key, kind), calling compute() and storing its result on a miss.
+        """
+        value = self.get(key, kind)
+        if value is None:
+            value = compute()
+            self.put(key, kind, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        for path, _, _ in self._disk_entries():
+            _remove_quietly(path)
+
+    def _remember(self, key, kind, value, size):
+        with self._lock:
+            replaced = self._memory.pop((key, kind), None)
+            if replaced is not None:
+                self._memory_bytes -= replaced[1]
+            if size > self.max_memory_bytes:
+                # Kept on disk only (if at all), rather than flushing everything else out
+                return
+            self._memory[(key, kind)] = (value, size)
+            self._memory_bytes += size
+            while self._memory and (len(self._memory) > self.max_entries
+                                    or self._memory_bytes > self.max_memory_bytes):
+                _, (_, evicted_size) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def _disk_path(self, key, kind):
+        return os.path.join(self.cache_dir, f"{key}.{kind}.pkl")
+
+    def _read_disk(self, key, kind):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key, kind)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        # Mark as recently used for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write_disk(self, key, kind, data):
+        if not self.cache_dir:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key, kind))
+        except OSError:
+            _remove_quietly(tmp_path)
+            return
+        self._evict_disk()
+
+    def _disk_entries(self):
+        if not self.cache_dir:
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict_disk(self):
+        entries = self._disk_entries()
+        total = sum(size for _, _, size in entries)
+        if total <= self.max_disk_bytes:
+            return
+        entries.sort(key=lambda entry: entry[1])
+        for path, _, size in entries:
+            if total <= self.max_disk_bytes:
+                break
+            _remove_quietly(path)
+            total -= size
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def get_default_cache():
+    """
+    Return the process-wide cache shared by all app sessions.
+    The disk level is enabled by setting LEDGER_CACHE_DIR (size limit: LEDGER_CACHE_MAX_MB, default 512).
+    The in-process level holds up to LEDGER_CACHE_MEMORY_MB (default 256) of pickled values.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_mb = int(os.environ.get(CACHE_MAX_MB_ENV, "512"))
+            memory_mb = int(os.environ.get(CACHE_MEMORY_MB_ENV, "256"))
+            _default_cache = LedgerCache(
+                cache_dir=os.environ.get(CACHE_DIR_ENV) or None,
+                max_disk_bytes=max_mb * 1024 * 1024,
+                max_memory_bytes=memory_mb * 1024 * 1024,
+            )
+        return _default_cache
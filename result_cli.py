@@ -0,0 +1,353 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import as_completed
+
+from result_cache import ledger_key
+from result_export import (
+    EXPORT_FORMATS, SPLIT_COLUMN, format_from_path, parse_subject_list, write_output, write_split_zip,
+)
+from result_extract import AUTO, BACKEND_ENV, EXTRACTORS, get_extractor, iter_pdf_pages, process_pool
+from result_incremental import ingest_incremental, write_delta_report
+from result_metrics import PipelineStats, timed
+from result_parser import SUBJECT_FIELDS, iter_lines, scan_ledger
+from result_profiles import PROFILE_DIR_ENV
+from result_store import StudentStore
+from result_table import StudentTable
+
+INPUT_EXTENSIONS = (".pdf", ".txt")
+
+USAGE_EXAMPLES = """
+examples:
+  python result_cli.py ledgers/ -o merged.xlsx
+  python result_cli.py ledgers/ -o merged.xlsx --analytics
+  python result_cli.py ledgers/ -o merged.xlsx --anomalies anomalies.json
+  python result_cli.py university.pdf -o colleges.zip --split-by "College Code" --jobs 8
+  python result_cli.py ledgers/ -o ml.csv --subjects "MACHINE LEARNING" --only-selected --fields Total,Grade
+  python result_cli.py "ledgers/**/*.pdf" --per-file -o out/ --format parquet --jobs 8
+  python result_cli.py ledgers/ -o merged.xlsx --db results.db --db-label "BE IT Dec 2023"
+  python result_cli.py reval.pdf -o delta.xlsx --incremental --db results.db --db-label "BE IT Dec 2023"
+
+Files are parsed on a process pool with the same parser as the Streamlit app. A file that
+fails is reported and skipped without stopping the others.
+"""
+
+def find_inputs(patterns):
+    """
+    Expand files, directories (searched recursively) and glob patterns into a sorted, de-duplicated list.
+    """
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                found.extend(os.path.join(root, name) for name in names
+                             if name.lower().endswith(INPUT_EXTENSIONS))
+        elif os.path.isfile(pattern):
+            found.append(pattern)
+        else:
+            found.extend(path for path in glob.glob(pattern, recursive=True)
+                         if os.path.isfile(path) and path.lower().endswith(INPUT_EXTENSIONS))
+    return sorted(set(found))
+
+def parse_ledger_file(path, extract_workers=1, stats=None, subjects=None, fields=None):
+    """
+    Parse one PDF or text ledger and return (detected subjects, StudentTable).
+    Stage times and parse counters are added to stats (a PipelineStats) when given.
+    subjects and fields restrict the columns that are extracted (see result_parser.LedgerScanner).
+    """
+    if path.lower().endswith(".pdf"):
+        # The file is read page by page, not loaded into memory
+        pages = timed(iter_pdf_pages(path, extract_workers, stats), stats, "extract")
+        return scan_ledger(iter_lines(pages), stats, subjects=subjects, fields=fields)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return scan_ledger(f, stats, subjects=subjects, fields=fields)
+
+def parse_fields(fields_str):
+    """
+    Turn a comma-separated list of field names ("Total, Grade") into field suffixes (" (Total)", ...).
+    """
+    fields = []
+    for name in fields_str.split(","):
+        name = name.strip().strip("()")
+        if not name:
+            continue
+        field = f" ({name})"
+        if field not in SUBJECT_FIELDS:
+            known = ", ".join(known_field.strip(" ()") for known_field in SUBJECT_FIELDS)
+            raise ValueError(f"Unknown field {name!r} (known fields: {known})")
+        fields.append(field)
+    return fields
+
+def output_path_for(path, output_dir, fmt):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir, stem + EXPORT_FORMATS[fmt][0])
+
+def _process_file(path, subjects, output_dir, fmt, extract_workers, keep_students=False, analytics=False,
+                  projection=(None, None), validate=True):
+    """
+    Pool task: parse one file and either write its own output (output_dir set) or return the students.
+    Returns (path, subjects, students or None, student count, error text or None, stats dict, anomalies).
+    With keep_students, the students are returned even when the output was written.
+    projection is the (subjects, fields) to extract, None for all. With validate, the
+    students are checked with result_validate.validate_students (without the no_courses
+    check under a projection, which leaves some students' course lines out).
+    """
+    stats = PipelineStats()
+    try:
+        detected, students = parse_ledger_file(path, extract_workers, stats, *projection)
+        anomalies = []
+        if validate:
+            # numpy is only loaded by the processes that check students
+            from result_validate import CHECKS, PROJECTED_CHECKS, validate_students
+            checks = CHECKS if projection == (None, None) else PROJECTED_CHECKS
+            anomalies = validate_students(students, path, stats, checks)
+        if output_dir is None:
+            return path, detected, students, len(students), None, stats.to_dict(), anomalies
+        selected = subjects if subjects is not None else ", ".join(detected)
+        with stats.stage("export"):
+            write_output(students, selected, output_path_for(path, output_dir, fmt), fmt, analytics)
+        return path, detected, students if keep_students else None, len(students), None, stats.to_dict(), anomalies
+    except Exception:
+        return path, None, None, 0, traceback.format_exc(limit=3), stats.to_dict(), []
+
+def run_batch(paths, output, fmt, per_file=False, subjects=None, jobs=None, extract_workers=1,
+              progress=sys.stderr, store=None, label="", analytics=False, split_by=None,
+              projection=(None, None), validate=True, anomalies=None):
+    """
+    Convert every path and return (converted count, {path: error text}, run statistics).
+
+    With per_file, `output` is a directory that receives one output per input; otherwise all
+    students are merged, in input order, into the single file `output`. When subjects is None,
+    the detected subjects decide the column order. The run statistics are
+    {"files": {path: stats dict}, "total": stats dict} (see result_metrics.PipelineStats).
+    With a result_store.StudentStore, each parsed ledger is also stored in it under `label`.
+    With analytics, every xlsx output also gets the cohort analytics sheets (see result_analytics).
+    With split_by, the merged output is a ZIP at `output` with one `fmt` file per value of that
+    column (see result_export.write_split_zip), written on `jobs` processes.
+    projection is the (subject names, field suffixes) to extract from every file; None
+    extracts all subjects or fields. With validate, every file is checked for extraction
+    errors (see result_validate) and the anomalies found are added to the `anomalies` list.
+    """
+    if per_file:
+        os.makedirs(output, exist_ok=True)
+    output_dir = output if per_file else None
+
+    results = {}
+    errors = {}
+    file_stats = {}
+    total_stats = PipelineStats()
+    started = time.perf_counter()
+    with process_pool(jobs) as pool:
+        futures = {pool.submit(_process_file, path, subjects, output_dir, fmt, extract_workers,
+                               store is not None, analytics, projection, validate): path
+                   for path in paths}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                path, detected, students, count, error, stats, found = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                path, detected, students, count, error, stats, found = futures[future], None, None, 0, repr(e), None, []
+            if anomalies is not None:
+                anomalies.extend(found)
+            if stats is not None:
+                file_stats[path] = stats
+                total_stats.merge(stats)
+            if error:
+                errors[path] = error
+                status = "FAILED: " + error.strip().splitlines()[-1]
+            else:
+                if store is not None:
+                    # Stored here, in the parent, so the database has a single writer
+                    with total_stats.stage("store"):
+                        store.add_ledger(students, source=path, label=label, ledger_key=ledger_key(path))
+                    if per_file:
+                        students = None
+                results[path] = (detected, students)
+                status = f"{count} students" + (f", {len(found)} anomalies" if found else "")
+            if progress is not None:
+                elapsed = time.perf_counter() - started
+                print(f"[{done}/{len(paths)}] {elapsed:7.1f}s {path}: {status}", file=progress, flush=True)
+
+    if not per_file and results:
+        merged = StudentTable()
+        merged_subjects = []
+        for path in paths:
+            if path not in results:
+                continue
+            detected, students = results.pop(path)
+            for subject in detected:
+                if subject not in merged_subjects:
+                    merged_subjects.append(subject)
+            for record in students:
+                merged.append(record)
+        selected = subjects if subjects is not None else ", ".join(merged_subjects)
+        with total_stats.stage("export"):
+            if split_by:
+                write_split_zip(merged, selected, output, split_by, fmt, jobs, analytics)
+            else:
+                write_output(merged, selected, output, fmt, analytics)
+
+    run_stats = {"files": dict(sorted(file_stats.items())), "total": total_stats.to_dict()}
+    return len(paths) - len(errors), errors, run_stats
+
+def run_incremental(paths, output, fmt, store, label, progress=sys.stderr):
+    """
+    Apply every path, one after the other, to the ledger stored under `label` (see
+    result_incremental.ingest_incremental) and write the inserted and changed students of
+    all of them to `output`. Returns the same (converted, errors, run statistics) as run_batch.
+    """
+    reports = []
+    errors = {}
+    file_stats = {}
+    total_stats = PipelineStats()
+    started = time.perf_counter()
+    for done, path in enumerate(paths, 1):
+        stats = PipelineStats()
+        try:
+            report = ingest_incremental(store, path, label, stats)
+        except Exception:
+            errors[path] = traceback.format_exc(limit=3)
+            status = "FAILED: " + errors[path].strip().splitlines()[-1]
+        else:
+            reports.append(report)
+            status = (f"{report['pages_skipped']}/{report['pages']} pages unchanged, {report['inserted']} inserted, "
+                      f"{report['changed']} changed, {report['unchanged']} unchanged")
+        file_stats[path] = stats.to_dict()
+        total_stats.merge(stats)
+        if progress is not None:
+            elapsed = time.perf_counter() - started
+            print(f"[{done}/{len(paths)}] {elapsed:7.1f}s {path}: {status}", file=progress, flush=True)
+
+    with total_stats.stage("export"):
+        write_delta_report(reports, output, fmt)
+    run_stats = {"files": dict(sorted(file_stats.items())), "total": total_stats.to_dict()}
+    return len(paths) - len(errors), errors, run_stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert SPPU result ledgers (PDF or text) in bulk.",
+        epilog=USAGE_EXAMPLES, formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("inputs", nargs="+", help="PDF/text files, directories or glob patterns")
+    parser.add_argument("-o", "--output", required=True,
+                        help="output file (merged) or directory (with --per-file)")
+    parser.add_argument("--per-file", action="store_true", help="write one output per input file")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS),
+                        help="output format (default: from the output extension, or xlsx)")
+    parser.add_argument("--subjects", help="comma-separated subjects to put first (default: detected)")
+    parser.add_argument("--only-selected", action="store_true",
+                        help="extract and export only the --subjects columns; Total, %% and Result "
+                             "then count those subjects only")
+    parser.add_argument("--fields",
+                        help="comma-separated subject fields to extract, e.g. 'Total,Grade' (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, help="parallel files (default: one per CPU)")
+    parser.add_argument("--extract-workers", type=int, default=1,
+                        help="processes per PDF for text extraction (default: 1)")
+    parser.add_argument("--pdf-backend", choices=[AUTO] + list(EXTRACTORS),
+                        help="text-extraction backend (default: LEDGER_PDF_BACKEND, else the fastest "
+                             "installed one that reads the first pages correctly)")
+    parser.add_argument("--profile-dir", metavar="DIR",
+                        help="keep the learned layout profiles of ledger formats in DIR (default: "
+                             "LEDGER_PROFILE_DIR, else LEDGER_CACHE_DIR/profiles, else this run only)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="don't print progress")
+    parser.add_argument("--analytics", action="store_true",
+                        help="add pass-rate, grade, topper and college sheets to the xlsx output")
+    parser.add_argument("--split-by", metavar="COLUMN", nargs="?", const=SPLIT_COLUMN,
+                        help="write a ZIP at --output with one file per value of COLUMN "
+                             "(default: College Code), in --format")
+    parser.add_argument("--db", metavar="PATH",
+                        help="also store the students in this SQLite database (see result_store.py)")
+    parser.add_argument("--db-label", default="",
+                        help="name of the ledgers in the database, e.g. 'BE IT Dec 2023'")
+    parser.add_argument("--incremental", action="store_true",
+                        help="apply the inputs to the --db ledger named --db-label, re-reading only "
+                             "changed pages, and write only the inserted/changed students to --output")
+    parser.add_argument("--anomalies", metavar="PATH",
+                        help="write the records failing a consistency check (Insem + ESE != Total, marks "
+                             "above their maximum, SGPA outside 0-10, no course lines) to PATH: .json, "
+                             ".xlsx, .csv, ...")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="skip the consistency checks (they run by default)")
+    parser.add_argument("--stats-json", metavar="PATH",
+                        help="write per-stage timings and parse counters as JSON ('-' for stdout)")
+    args = parser.parse_args(argv)
+    if args.incremental and not (args.db and args.db_label):
+        parser.error("--incremental needs --db and --db-label")
+    if args.incremental and args.per_file:
+        parser.error("--incremental writes a single delta report; it can't be combined with --per-file")
+
+    paths = find_inputs(args.inputs)
+    if not paths:
+        print("No PDF or text ledgers found.", file=sys.stderr)
+        return 2
+
+    if args.pdf_backend:
+        # Read by result_extract.get_extractor here and in the worker processes
+        os.environ[BACKEND_ENV] = args.pdf_backend
+    if args.profile_dir:
+        # Read by result_profiles.get_profile_store here and in the worker processes
+        os.environ[PROFILE_DIR_ENV] = args.profile_dir
+
+    if args.only_selected and not args.subjects:
+        parser.error("--only-selected needs --subjects")
+    if (args.only_selected or args.fields) and (args.db or args.incremental):
+        parser.error("--only-selected and --fields store partial records; they can't be combined with --db")
+    try:
+        fields = parse_fields(args.fields) if args.fields else None
+    except ValueError as e:
+        parser.error(str(e))
+    projection = (parse_subject_list(args.subjects) if args.only_selected else None, fields)
+    if args.anomalies and (args.no_validate or args.incremental):
+        parser.error("--anomalies can't be combined with --no-validate or --incremental")
+    if args.split_by and (args.per_file or args.incremental):
+        parser.error("--split-by can't be combined with --per-file or --incremental")
+
+    fmt = args.format or ("xlsx" if args.per_file or args.split_by else format_from_path(args.output))
+    if args.analytics and (fmt != "xlsx" or args.incremental):
+        parser.error("--analytics needs the xlsx format and can't be combined with --incremental")
+
+    pdfs = [path for path in paths if path.lower().endswith(".pdf")]
+    if pdfs and os.environ.get(BACKEND_ENV, AUTO) == AUTO:
+        # Calibrate once, here, on the largest PDF; the worker processes inherit the choice
+        os.environ[BACKEND_ENV] = get_extractor(source=max(pdfs, key=os.path.getsize)).name
+
+    store = StudentStore(args.db) if args.db else None
+    anomalies = []
+    try:
+        if args.incremental:
+            converted, errors, run_stats = run_incremental(
+                paths, args.output, fmt, store, args.db_label, progress=None if args.quiet else sys.stderr,
+            )
+        else:
+            converted, errors, run_stats = run_batch(
+                paths, args.output, fmt, per_file=args.per_file, subjects=args.subjects, jobs=args.jobs,
+                extract_workers=args.extract_workers, progress=None if args.quiet else sys.stderr,
+                store=store, label=args.db_label, analytics=args.analytics, split_by=args.split_by,
+                projection=projection, validate=not args.no_validate, anomalies=anomalies,
+            )
+    finally:
+        if store is not None:
+            store.close()
+    print(f"Converted {converted} of {len(paths)} files.", file=sys.stderr)
+    if anomalies:
+        print(f"{len(anomalies)} possible extraction errors"
+              + (f", written to {args.anomalies}." if args.anomalies else " (list them with --anomalies report.json)."),
+              file=sys.stderr)
+    if args.anomalies:
+        from result_validate import write_anomaly_report
+        write_anomaly_report(anomalies, args.anomalies)
+    if args.stats_json == "-":
+        print(json.dumps(run_stats, indent=2))
+    elif args.stats_json:
+        with open(args.stats_json, "w", encoding="utf-8") as f:
+            json.dump(run_stats, f, indent=2)
+    for path, error in errors.items():
+        print(f"\n{path}:\n{error}", file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
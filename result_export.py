@@ -0,0 +1,420 @@
+import os
+import re
+import zipfile
+from bisect import bisect_left
+from concurrent.futures import as_completed
+from io import BytesIO
+from itertools import islice
+from result_extract import process_pool, resolve_workers
+from result_table import StudentTable
+
+# Student columns that come before and after the per-subject columns in every export
+LEADING_COLUMNS = ["Sr.", "Seat No.", "Name of Student", "Mother's Name", "PRN", "College Code"]
+TRAILING_COLUMNS = ["SGPA", "Total Credits", "CGPA", "Total", "%", "Result"]
+COMMON_COLUMNS = LEADING_COLUMNS[1:] + TRAILING_COLUMNS
+
+# Order of the fields of a selected subject: Code, Insem, ESE, Total, TW, PR, etc.
+FIELD_ORDER = [" (Code)", " (Insem)", " (ESE)", " (Total)", " (TW)", " (PR)", " (Status)",
+               " (Tot%)", " (Grade)", " (GP)", " (CP)"]
+FIELD_RANK = {field: rank for rank, field in enumerate(FIELD_ORDER)}
+
+# Mark fields that can hold a status code (AB, FF, PP, ...) instead of a number.
+# Typed exports split them into an integer column and a categorical "<column> Status" column.
+MARK_FIELDS = (" (Insem)", " (ESE)", " (Total)", " (TW)", " (PR)")
+STATUS_COLUMN_SUFFIX = " Status"
+
+# Other numeric fields; anything that isn't a number becomes a missing value
+NUMERIC_FIELDS = (" (GP)", " (CP)", " (Tot%)")
+NUMERIC_COLUMNS = {"Sr.", "SGPA", "Total Credits", "CGPA", "Total", "%"}
+# Numeric columns that are always fractional; the others are Int64 unless a value isn't whole
+FLOAT_FIELDS = (" (Tot%)",)
+FLOAT_COLUMNS = {"SGPA", "CGPA", "%"}
+
+# Low-cardinality text stored as categories
+CATEGORY_FIELDS = (" (Code)", " (Grade)", " (Status)")
+CATEGORY_COLUMNS = {"College Code", "Result"}
+
+# Rows per chunk for the streaming CSV export
+CSV_CHUNK_ROWS = 5000
+
+# Default column to split an export by, and the file name of students without a value in it
+SPLIT_COLUMN = "College Code"
+SPLIT_MISSING = "unknown"
+
+# Excel column width limits
+MAX_COLUMN_WIDTH = 30
+COLUMN_PADDING = 2
+
+def parse_subject_list(selected_subjects_str):
+    """
+    Split a comma-separated list of base subject names.
+    """
+    return [x.strip() for x in selected_subjects_str.split(",") if x.strip()]
+
+def subject_keys(students):
+    """
+    Return the set of per-subject column names of a StudentTable or list of student dictionaries.
+    """
+    if isinstance(students, StudentTable):
+        keys = set(students.columns)
+    else:
+        keys = set()
+        for s in students:
+            keys.update(s.keys())
+    return keys.difference(COMMON_COLUMNS)
+
+def selected_subject_columns(keys, user_subjects):
+    """
+    Return the columns of each selected subject: keys starting with the subject name,
+    case-insensitively, in FIELD_ORDER.
+
+    The keys are indexed once by their upper-cased name, so each subject is resolved with a
+    binary search for its prefix instead of a pass over every key for every field.
+    """
+    index = sorted((key.upper(), key) for key in keys)
+    upper_keys = [upper for upper, _ in index]
+
+    ordered = []
+    placed = set()
+    for subj in user_subjects:
+        prefix = subj.upper()
+        matches = []
+        for position in range(bisect_left(upper_keys, prefix), len(index)):
+            upper, key = index[position]
+            if not upper.startswith(prefix):
+                break
+            rank = FIELD_RANK.get(key[key.rfind(" ("):])
+            if rank is not None:
+                matches.append((rank, key))
+        matches.sort()
+        for _, key in matches:
+            if key not in placed:
+                placed.add(key)
+                ordered.append(key)
+    return ordered
+
+def order_subject_columns(keys, user_subjects):
+    """
+    Order subject columns: first the columns of each selected subject (see
+    selected_subject_columns), then all remaining keys sorted.
+    """
+    ordered = selected_subject_columns(keys, user_subjects)
+    # Add any remaining subject fields not covered by user selection
+    placed = set(ordered)
+    ordered.extend(key for key in sorted(keys) if key not in placed)
+    return ordered
+
+def export_columns(students, selected_subjects_str):
+    """
+    Return the full, ordered column list of the exported sheet, starting with "Sr.".
+    """
+    subject_cols = order_subject_columns(subject_keys(students), parse_subject_list(selected_subjects_str))
+    return LEADING_COLUMNS + subject_cols + TRAILING_COLUMNS
+
+def select_subjects(students, selected_subjects_str):
+    """
+    Return the students with only the columns of the selected subjects (and the common
+    student columns), so that the export leaves the other subjects out entirely.
+    The result is a StudentTable sharing its column lists with `students`.
+    """
+    if not isinstance(students, StudentTable):
+        students = StudentTable.from_records(students)
+    subject_cols = selected_subject_columns(subject_keys(students), parse_subject_list(selected_subjects_str))
+    return students.select(LEADING_COLUMNS[1:] + subject_cols + TRAILING_COLUMNS)
+
+def export_preview(students, selected_subjects_str, rows):
+    """
+    Return the first `rows` students as a DataFrame with the export's columns and column order.
+    Only those rows are materialized, so this stays cheap for large StudentTables.
+    """
+    if not isinstance(students, StudentTable):
+        students = StudentTable.from_records(students)
+    columns = export_columns(students, selected_subjects_str)
+    df = students.to_dataframe(columns[1:], rows=rows)
+    df.insert(0, "Sr.", range(1, len(df) + 1))
+    return df
+
+def iter_export_rows(students, columns):
+    """
+    Yield one value tuple per student for the given columns ("Sr." is numbered from 1).
+    Missing values are exported as "-".
+    """
+    data_columns = columns[1:]
+    if isinstance(students, StudentTable):
+        rows = students.iter_rows(data_columns, fill="-")
+    else:
+        rows = (tuple(s.get(col, "-") for col in data_columns) for s in students)
+    for sr, row in enumerate(rows, 1):
+        yield (sr,) + row
+
+def _write_sheet(workbook, name, columns, rows, header_format):
+    """
+    Write a header and rows to a new worksheet, sizing each column to its longest value.
+    """
+    worksheet = workbook.add_worksheet(name)
+    widths = [len(str(col)) for col in columns]
+    worksheet.write_row(0, 0, columns, header_format)
+    for row_number, row in enumerate(rows, 1):
+        worksheet.write_row(row_number, 0, row)
+        for i, value in enumerate(row):
+            width = len(str(value))
+            if width > widths[i]:
+                widths[i] = width
+
+    for i, width in enumerate(widths):
+        worksheet.set_column(i, i, min(width + COLUMN_PADDING, MAX_COLUMN_WIDTH))
+
+def _frame_rows(frame):
+    """
+    Yield the rows of a DataFrame as tuples of plain Python values, missing values as None.
+    """
+    for row in frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None):
+        yield row
+
+def write_excel_streaming(students, selected_subjects_str, output, analytics=False):
+    """
+    Write the student sheet to `output` (a path or binary file object) row by row.
+
+    The workbook uses xlsxwriter's constant_memory mode, so rows are flushed to disk as
+    they are written and no DataFrame or row list is built; column widths are tracked while
+    the rows go out. With analytics=True the sheets of result_analytics.cohort_analytics
+    (pass rates, grade distribution, toppers, college averages) follow the student sheet.
+    """
+    import xlsxwriter
+    columns = export_columns(students, selected_subjects_str)
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    header_format = workbook.add_format({'bold': True, 'bg_color': '#D9E1F2', 'border': 1})
+    _write_sheet(workbook, "Student Data", columns, iter_export_rows(students, columns), header_format)
+
+    if analytics:
+        from result_analytics import cohort_analytics
+        for name, frame in cohort_analytics(students).items():
+            _write_sheet(workbook, name, list(frame.columns), _frame_rows(frame), header_format)
+    workbook.close()
+
+def create_excel_streaming(students, selected_subjects_str):
+    """
+    Same sheet as write_excel_streaming, returned as bytes (for download buttons).
+    """
+    output = BytesIO()
+    write_excel_streaming(students, selected_subjects_str, output)
+    return output.getvalue()
+
+def _numeric(values, fractional=False):
+    """
+    Convert raw values to Float64 if fractional, else to Int64 (Float64 if a value isn't whole).
+    Values that aren't numbers ("-", "--", "AB", ...) become missing.
+    """
+    import pandas as pd
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+    if not fractional:
+        whole = numbers.dropna()
+        if (whole == whole.round()).all():
+            return numbers.astype("Int64")
+    return numbers.astype("Float64")
+
+def typed_columns(columns):
+    """
+    Return the column names of the typed exports, with a " Status" column after every mark column.
+    """
+    names = []
+    for name in columns:
+        names.append(name)
+        if name.endswith(MARK_FIELDS):
+            names.append(name + STATUS_COLUMN_SUFFIX)
+    return names
+
+def typed_frame(columns, rows):
+    """
+    Build a typed DataFrame from export rows (tuples in `columns` order).
+
+    Mark columns become nullable integers, with status codes such as AB, FF and PP moved to
+    a categorical "<column> Status" column; other numeric fields become Int64/Float64,
+    codes and grades categorical, and the remaining text columns strings.
+    """
+    import pandas as pd
+    values_by_column = list(zip(*rows)) if rows else [()] * len(columns)
+    data = {}
+    for name, values in zip(columns, values_by_column):
+        if name.endswith(MARK_FIELDS):
+            numbers = _numeric(values)
+            raw = pd.Series(values, dtype=object)
+            status = raw.where(numbers.isna() & ~raw.isin(["-", ""]))
+            data[name] = numbers
+            data[name + STATUS_COLUMN_SUFFIX] = status.astype("category")
+        elif name in NUMERIC_COLUMNS or name.endswith(NUMERIC_FIELDS):
+            data[name] = _numeric(values, name in FLOAT_COLUMNS or name.endswith(FLOAT_FIELDS))
+        elif name in CATEGORY_COLUMNS or name.endswith(CATEGORY_FIELDS):
+            raw = pd.Series(values, dtype=object)
+            data[name] = raw.where(raw != "-").astype("category")
+        else:
+            data[name] = pd.Series(values, dtype="string")
+    return pd.DataFrame(data, columns=typed_columns(columns))
+
+def typed_dataframe(students, selected_subjects_str=""):
+    """
+    Return all students as one typed DataFrame (see typed_frame), in export column order.
+    """
+    columns = export_columns(students, selected_subjects_str)
+    return typed_frame(columns, list(iter_export_rows(students, columns)))
+
+def write_parquet(students, selected_subjects_str, output):
+    """
+    Write the typed students to a Parquet file (needs pyarrow or fastparquet).
+    """
+    typed_dataframe(students, selected_subjects_str).to_parquet(output, index=False)
+
+def write_arrow(students, selected_subjects_str, output):
+    """
+    Write the typed students as an Arrow IPC (Feather v2) file (needs pyarrow).
+    """
+    typed_dataframe(students, selected_subjects_str).to_feather(output)
+
+def iter_csv_chunks(students, selected_subjects_str, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Yield the typed CSV export as text chunks of at most chunk_rows students each.
+    The first chunk starts with the header; only one chunk is held in memory at a time.
+    """
+    columns = export_columns(students, selected_subjects_str)
+    rows = iter_export_rows(students, columns)
+    header = True
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk and not header:
+            return
+        yield typed_frame(columns, chunk).to_csv(index=False, header=header, lineterminator="\n")
+        header = False
+        if len(chunk) < chunk_rows:
+            return
+
+def write_csv(students, selected_subjects_str, output, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Stream the typed CSV export to `output` (a path or binary file object).
+    """
+    if isinstance(output, (str, os.PathLike)):
+        with open(output, "wb") as f:
+            write_csv(students, selected_subjects_str, f, chunk_rows)
+        return
+    for chunk in iter_csv_chunks(students, selected_subjects_str, chunk_rows):
+        output.write(chunk.encode("utf-8"))
+
+# Export format -> (file extension, MIME type, writer(students, selected_subjects_str, output))
+EXPORT_FORMATS = {
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", write_excel_streaming),
+    "csv": (".csv", "text/csv", write_csv),
+    "parquet": (".parquet", "application/vnd.apache.parquet", write_parquet),
+    "arrow": (".arrow", "application/vnd.apache.arrow.file", write_arrow),
+}
+
+def format_from_path(path):
+    """
+    Guess the export format from a file name, defaulting to xlsx.
+    """
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension == ".feather":
+        return "arrow"
+    for fmt, (fmt_extension, _, _) in EXPORT_FORMATS.items():
+        if extension == fmt_extension:
+            return fmt
+    return "xlsx"
+
+def write_output(students, selected_subjects_str, output, fmt=None, analytics=False):
+    """
+    Write students in the given format ("xlsx", "csv", "parquet" or "arrow").
+    When fmt is None it is taken from the extension of the output path.
+    analytics=True adds the analytics sheets, which only the xlsx format can hold.
+    """
+    if fmt is None:
+        fmt = format_from_path(output)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if analytics:
+        if fmt != "xlsx":
+            raise ValueError(f"Analytics sheets need the xlsx format, not {fmt}")
+        write_excel_streaming(students, selected_subjects_str, output, analytics=True)
+        return
+    EXPORT_FORMATS[fmt][2](students, selected_subjects_str, output)
+
+def export_bytes(students, selected_subjects_str, fmt, analytics=False):
+    """
+    Return the export in the given format as bytes (for download buttons).
+    """
+    output = BytesIO()
+    write_output(students, selected_subjects_str, output, fmt, analytics)
+    return output.getvalue()
+
+def partition_students(students, column=SPLIT_COLUMN):
+    """
+    Split students by their value in `column` and return {value: StudentTable}, in order of
+    first appearance. Students without a value are grouped under SPLIT_MISSING. Each
+    partition takes its rows' values from the table's columns (see StudentTable.take).
+    """
+    if not isinstance(students, StudentTable):
+        students = StudentTable.from_records(students)
+    rows = {}
+    for row, value in enumerate(students.column(column, SPLIT_MISSING)):
+        indexes = rows.get(value)
+        if indexes is None:
+            indexes = rows[value] = []
+        indexes.append(row)
+    return {value: students.take(indexes) for value, indexes in rows.items()}
+
+def split_file_name(value, fmt):
+    """
+    File name of one partition in the ZIP, e.g. "CEGP010530.xlsx".
+    """
+    stem = re.sub(r"[^\w.-]+", "_", str(value)).strip("._") or SPLIT_MISSING
+    return stem + EXPORT_FORMATS[fmt][0]
+
+def _export_partition(value, students, selected_subjects_str, fmt, analytics):
+    """
+    Pool task: export one partition and return (value, file bytes).
+    """
+    return value, export_bytes(students, selected_subjects_str, fmt, analytics)
+
+def write_split_zip(students, selected_subjects_str, output, column=SPLIT_COLUMN, fmt="xlsx",
+                    workers=None, analytics=False):
+    """
+    Write one file per value of `column` (one workbook per college by default) into a ZIP at
+    `output` (a path or binary file object), and return {file name: student count}.
+
+    The partitions are exported on a pool of `workers` processes (None for one per CPU),
+    largest first, so the run takes about as long as the biggest partition. The files are
+    added to the ZIP in order of their value as soon as they and the ones before them are
+    ready. Files are stored uncompressed, since xlsx, Parquet and Arrow are compressed already.
+    """
+    partitions = partition_students(students, column)
+    order = sorted(partitions, key=lambda value: len(partitions[value]), reverse=True)
+    zip_order = sorted(partitions, key=str)
+    counts = {}
+    names = {}
+    for value in zip_order:
+        name = split_file_name(value, fmt)
+        while name in counts:
+            name = "_" + name
+        names[value] = name
+        counts[name] = len(partitions[value])
+
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as archive:
+        ready = {}
+        written = 0
+
+        def add(value, data):
+            nonlocal written
+            ready[value] = data
+            while written < len(zip_order) and zip_order[written] in ready:
+                archive.writestr(names[zip_order[written]], ready.pop(zip_order[written]))
+                written += 1
+
+        workers = min(resolve_workers(workers), len(order)) if order else 1
+        if workers == 1:
+            for value in zip_order:
+                add(*_export_partition(value, partitions[value], selected_subjects_str, fmt, analytics))
+        else:
+            with process_pool(workers) as pool:
+                futures = [pool.submit(_export_partition, value, partitions[value], selected_subjects_str,
+                                       fmt, analytics)
+                           for value in order]
+                for future in as_completed(futures):
+                    add(*future.result())
+    return counts
@@ -0,0 +1,522 @@
+import atexit
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+# PyPDF2 is imported by the functions that open PDFs, so importing this module (e.g. for
+# spool_to_file) doesn't load it.
+
+# Below this many pages, starting worker processes costs more than it saves
+PARALLEL_MIN_PAGES = 40
+
+# Each worker gets this many page ranges on average, so one slow range doesn't stall the pool
+CHUNKS_PER_WORKER = 4
+
+# Pool processes are spawned rather than forked: the app runs extraction and exports from
+# Streamlit's threads, and a child forked from a multi-threaded process can deadlock on a lock
+# another thread held at the time of the fork
+POOL_START_METHOD = "spawn"
+
+# Per-process backend and document, opened once by _init_worker over the shared PDF file
+_worker_extractor = None
+_worker_pdf = None
+_worker_document = None
+
+# Chunk size for copying uploads to disk
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+def resolve_workers(workers):
+    """
+    Turn a worker setting into a process count.
+    None or 0 means one worker per CPU; anything below 1 is treated as sequential.
+    """
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+def page_ranges(page_count, chunks):
+    """
+    Split range(page_count) into at most `chunks` contiguous (start, stop) ranges of similar size.
+    """
+    chunks = max(1, min(chunks, page_count))
+    size, extra = divmod(page_count, chunks)
+    ranges = []
+    start = 0
+    for i in range(chunks):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+@contextmanager
+def open_pdf(source):
+    """
+    Open a PdfReader over a PDF given as bytes, a path or a binary file object.
+
+    A path is read through a buffered file, so the reader seeks to and reads only the
+    objects it needs instead of the whole file being loaded into this process. (A memory
+    map would do the same, but every page it touches stays counted in the process's RSS.)
+    """
+    from PyPDF2 import PdfReader
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield PdfReader(BytesIO(source))
+        return
+    if not isinstance(source, (str, os.PathLike)):
+        yield PdfReader(source)
+        return
+    with open(source, "rb") as f:
+        yield PdfReader(f)
+
+def spool_to_file(source, directory=None):
+    """
+    Copy PDF bytes or a binary file object to a named temporary file in chunks and return its path.
+    The caller removes the file when it is no longer needed.
+    """
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            f.write(source)
+        else:
+            shutil.copyfileobj(source, f, SPOOL_CHUNK_BYTES)
+    return path
+
+def page_text(reader, page):
+    """
+    Extract the text of one page, then drop its content streams from the reader's object
+    cache. PdfReader otherwise keeps every decoded page stream, so memory would grow with
+    the size of the file instead of staying at about one page.
+    """
+    text = page.extract_text()
+    _evict_contents(reader, page)
+    return text
+
+def _content_refs(page):
+    from PyPDF2.generic import ArrayObject
+    contents = dict.get(page, "/Contents")
+    if contents is None:
+        return []
+    return contents if isinstance(contents, ArrayObject) else [contents]
+
+def _evict_contents(reader, page):
+    from PyPDF2.generic import IndirectObject
+    for ref in _content_refs(page):
+        if isinstance(ref, IndirectObject):
+            reader.resolved_objects.pop((ref.generation, ref.idnum), None)
+
+def page_content_hash(reader, page):
+    """
+    Return a SHA-256 hex digest of a page's decoded content streams, without extracting its
+    text. Pages that draw the same content hash the same, whichever file they come from.
+    """
+    digest = hashlib.sha256()
+    for ref in _content_refs(page):
+        digest.update(ref.get_object().get_data())
+    _evict_contents(reader, page)
+    return digest.hexdigest()
+
+# Page attributes a page inherits from its /Pages ancestors
+INHERITED_PAGE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+def iter_leading_pages(reader):
+    """
+    Yield the pages of a PDF in order by walking its page tree lazily.
+
+    reader.pages resolves every page object of the file before returning the first one,
+    which takes about a second per 10,000 pages; this reads only as many page objects as
+    the caller consumes, with inherited attributes filled in the same way.
+    """
+    from PyPDF2 import PageObject
+    from PyPDF2.generic import IndirectObject
+    root = reader.trailer["/Root"]["/Pages"]
+
+    def walk(node, inherited, reference):
+        if node.get("/Type", "/Pages") == "/Pages":
+            inherited = dict(inherited)
+            for attr in INHERITED_PAGE_ATTRIBUTES:
+                if attr in node:
+                    inherited[attr] = node[attr]
+            for kid in node["/Kids"]:
+                yield from walk(kid.get_object(), inherited, kid if isinstance(kid, IndirectObject) else None)
+        else:
+            page = PageObject(reader, reference)
+            page.update(node)
+            for attr, value in inherited.items():
+                if attr not in node:
+                    page[attr] = value
+            yield page
+
+    return walk(root, {}, None)
+
+class Extractor(ABC):
+    """
+    A text-extraction backend. It opens a PDF (bytes, a path or a binary file object),
+    counts its pages and yields the text of a range of pages, one string per page ("" for
+    a page without text). `module` is the package it needs; a backend whose package isn't
+    installed is never chosen.
+    """
+    name = None
+    module = None
+
+    def available(self):
+        return importlib.util.find_spec(self.module) is not None
+
+    @abstractmethod
+    def open(self, source):
+        """
+        Return a context manager that yields the opened document.
+        """
+
+    @abstractmethod
+    def page_count(self, document):
+        """
+        Return the number of pages of an opened document.
+        """
+
+    @abstractmethod
+    def page_texts(self, document, start=0, stop=None):
+        """
+        Yield the text of pages [start, stop) of an opened document.
+        """
+
+class PyPDF2Extractor(Extractor):
+    """
+    PyPDF2's page.extract_text(); always installed, and the fallback of every selection.
+    """
+    name = "pypdf2"
+    module = "PyPDF2"
+
+    def open(self, source):
+        return open_pdf(source)
+
+    def page_count(self, reader):
+        return len(reader.pages)
+
+    def page_texts(self, reader, start=0, stop=None):
+        if start == 0:
+            # Only as much of the page tree as is read (see iter_leading_pages)
+            pages = islice(iter_leading_pages(reader), stop)
+        else:
+            stop = len(reader.pages) if stop is None else stop
+            pages = (reader.pages[i] for i in range(start, stop))
+        for page in pages:
+            yield page_text(reader, page) or ""
+
+# PDFium isn't thread-safe; every call into it from this process goes through this lock
+_pdfium_lock = threading.Lock()
+
+class PdfiumExtractor(Extractor):
+    """
+    pypdfium2, PDFium's text layer: several times faster than PyPDF2 on SPPU ledgers.
+    """
+    name = "pdfium"
+    module = "pypdfium2"
+
+    @contextmanager
+    def open(self, source):
+        import pypdfium2
+        if isinstance(source, (bytearray, memoryview)):
+            source = bytes(source)
+        elif isinstance(source, os.PathLike):
+            source = os.fspath(source)
+        with _pdfium_lock:
+            document = pypdfium2.PdfDocument(source)
+        try:
+            yield document
+        finally:
+            with _pdfium_lock:
+                document.close()
+
+    def page_count(self, document):
+        return len(document)
+
+    def page_texts(self, document, start=0, stop=None):
+        stop = len(document) if stop is None else min(stop, len(document))
+        for i in range(start, stop):
+            with _pdfium_lock:
+                page = document[i]
+                text_page = page.get_textpage()
+                text = text_page.get_text_range()
+                text_page.close()
+                page.close()
+            yield text.replace("\r\n", "\n")
+
+class PdfMinerExtractor(Extractor):
+    """
+    pdfminer.six's layout-aware text converter.
+    """
+    name = "pdfminer"
+    module = "pdfminer"
+
+    @contextmanager
+    def open(self, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            yield BytesIO(source)
+        elif isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                yield f
+        else:
+            yield source
+
+    def page_count(self, document):
+        from pdfminer.pdfpage import PDFPage
+        document.seek(0)
+        return sum(1 for _ in PDFPage.get_pages(document))
+
+    def page_texts(self, document, start=0, stop=None):
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        output = StringIO()
+        manager = PDFResourceManager()
+        device = TextConverter(manager, output, laparams=LAParams())
+        interpreter = PDFPageInterpreter(manager, device)
+        document.seek(0)
+        try:
+            for page in islice(PDFPage.get_pages(document, maxpages=stop or 0), start, None):
+                interpreter.process_page(page)
+                # The converter ends every page with a form feed
+                yield output.getvalue().replace("\f", "")
+                output.seek(0)
+                output.truncate(0)
+        finally:
+            device.close()
+
+# Text-extraction backends by name, in order of preference between equally fast ones
+EXTRACTORS = {extractor.name: extractor for extractor in (PyPDF2Extractor(), PdfiumExtractor(), PdfMinerExtractor())}
+DEFAULT_EXTRACTOR = "pypdf2"
+
+# Backend setting: a name from EXTRACTORS, or "auto" (the default) to calibrate on the first PDF
+BACKEND_ENV = "LEDGER_PDF_BACKEND"
+AUTO = "auto"
+
+# Pages of the PDF the calibration extracts with each installed backend
+CALIBRATION_PAGES = 3
+
+# Smaller PDFs are read with DEFAULT_EXTRACTOR without calibrating: a faster backend can't
+# win back the time calibration takes (about 0.4s with pdfminer installed) on a few dozen pages
+CALIBRATION_MIN_BYTES = 512 * 1024
+
+# The calibrated choice is kept in this file of LEDGER_CACHE_DIR, for the installed backends
+CACHE_DIR_ENV = "LEDGER_CACHE_DIR"
+CALIBRATION_FILE = "pdf-backend.json"
+
+_calibrated = None
+_calibration_lock = threading.Lock()
+
+def sample_parses(texts):
+    """
+    Check that sample page texts parse cleanly: every "SEAT NO.:" line is read as a student
+    header with a PRN, and every student has course lines.
+    """
+    from result_parser import LedgerScanner
+    lines = [line for text in texts for line in text.splitlines()]
+    scanner = LedgerScanner()
+    students = list(scanner.scan(lines))
+    counts = scanner.counts
+    return (bool(students)
+            and counts["header_lines"] == sum("SEAT NO.:" in line for line in lines)
+            and counts["course_lines"] >= len(students)
+            and all(student["PRN"] != "-" for student in students))
+
+def calibrate(source, pages=CALIBRATION_PAGES):
+    """
+    Extract the first pages of a PDF with every installed backend and return (the name of
+    the fastest one whose text passes sample_parses, {name: seconds per page, or None when
+    its text didn't parse or it failed}). Falls back to DEFAULT_EXTRACTOR when none passes.
+    """
+    timings = {}
+    for name, extractor in EXTRACTORS.items():
+        if not extractor.available():
+            continue
+        try:
+            with extractor.open(source) as document:
+                started = time.perf_counter()
+                texts = list(extractor.page_texts(document, 0, pages))
+                elapsed = time.perf_counter() - started
+            timings[name] = elapsed / len(texts) if texts and sample_parses(texts) else None
+        except Exception:
+            timings[name] = None
+        finally:
+            if hasattr(source, "seek"):
+                source.seek(0)
+    passed = {name: seconds for name, seconds in timings.items() if seconds is not None}
+    return (min(passed, key=passed.get) if passed else DEFAULT_EXTRACTOR), timings
+
+def source_size(source):
+    """
+    Return the size in bytes of a PDF given as bytes, a path or a seekable binary file object.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    position = source.tell()
+    size = source.seek(0, os.SEEK_END)
+    source.seek(position)
+    return size
+
+def _calibration_path():
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    return os.path.join(cache_dir, CALIBRATION_FILE) if cache_dir else None
+
+def _load_calibration(installed):
+    path = _calibration_path()
+    if path is None:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Installing or removing a backend invalidates the choice
+    if saved.get("installed") != installed or saved.get("backend") not in EXTRACTORS:
+        return None
+    return saved["backend"]
+
+def _save_calibration(installed, backend, timings):
+    path = _calibration_path()
+    if path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"installed": installed, "backend": backend, "seconds_per_page": timings}, f, indent=1)
+        os.replace(temporary, path)
+    except OSError:
+        pass
+
+def get_extractor(backend=None, source=None):
+    """
+    Return the Extractor named by `backend`, else by LEDGER_PDF_BACKEND, else "auto".
+
+    "auto" uses PyPDF2 when it is the only backend installed. Otherwise the first PDF of at
+    least CALIBRATION_MIN_BYTES this process reads (source) is calibrated once (see calibrate)
+    and the choice is kept, also in LEDGER_CACHE_DIR when it is set, so later processes
+    don't calibrate again. Until then (source None, or a smaller PDF) PyPDF2 is used.
+    """
+    global _calibrated
+    name = backend or os.environ.get(BACKEND_ENV) or AUTO
+    if name != AUTO:
+        if name not in EXTRACTORS:
+            raise ValueError(f"Unknown PDF backend {name!r}; choose from {', '.join(EXTRACTORS)} or {AUTO}")
+        extractor = EXTRACTORS[name]
+        if not extractor.available():
+            raise ImportError(f"The {name} PDF backend needs the {extractor.module} package")
+        return extractor
+    installed = [name for name, extractor in EXTRACTORS.items() if extractor.available()]
+    if installed == [DEFAULT_EXTRACTOR]:
+        return EXTRACTORS[DEFAULT_EXTRACTOR]
+    with _calibration_lock:
+        if _calibrated is None:
+            _calibrated = _load_calibration(installed)
+        if _calibrated is None:
+            if source is None or source_size(source) < CALIBRATION_MIN_BYTES:
+                return EXTRACTORS[DEFAULT_EXTRACTOR]
+            _calibrated, timings = calibrate(source)
+            _save_calibration(installed, _calibrated, timings)
+        return EXTRACTORS[_calibrated]
+
+def process_pool(workers, **kwargs):
+    """
+    Return a ProcessPoolExecutor with `workers` processes started with POOL_START_METHOD.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(POOL_START_METHOD),
+                               **kwargs)
+
+def _init_worker(pdf_path, backend):
+    global _worker_extractor, _worker_pdf, _worker_document
+    _worker_extractor = EXTRACTORS[backend]
+    _worker_pdf = _worker_extractor.open(pdf_path)
+    _worker_document = _worker_pdf.__enter__()
+    # The document stays open for the worker's lifetime and is closed when the worker exits
+    atexit.register(_close_worker_document)
+
+def _close_worker_document():
+    global _worker_pdf, _worker_document
+    if _worker_pdf is not None:
+        pdf, _worker_pdf, _worker_document = _worker_pdf, None, None
+        pdf.__exit__(None, None, None)
+
+def _extract_page_range(start, stop):
+    """
+    Extract the text of pages [start, stop) with the document opened by this worker process.
+    """
+    return list(_worker_extractor.page_texts(_worker_document, start, stop))
+
+def iter_pdf_pages(source, workers=1, stats=None, max_pages=None, backend=None):
+    """
+    Yield the text of each page of a PDF, in page order ("" for a page without text), so the
+    n-th text is that of page n. The PDF is given as bytes, a file path (read on demand, see
+    open_pdf) or a binary file object. The text comes from the backend chosen by
+    get_extractor(backend).
+
+    With workers > 1 (or None for one per CPU) the pages are split into contiguous ranges
+    and extracted on a process pool; each worker opens the same file (bytes and file objects
+    are spooled to a temporary file first), so no PDF data is copied to the workers.
+    Results are yielded back in page order, so a student record that runs across a page
+    break is stitched together exactly as in the sequential path. Files with fewer than
+    PARALLEL_MIN_PAGES pages are always extracted sequentially.
+
+    When a result_metrics.PipelineStats is given, the pages read and the pages without
+    text are added to its "pages" and "empty_pages" counters.
+
+    With max_pages, only the first max_pages pages are read, sequentially, and the rest of
+    the document is never loaded where the backend allows it, e.g. for quick previews. Such
+    reads don't calibrate the "auto" backend: they use the calibrated one if any, else PyPDF2.
+    """
+    extractor = get_extractor(backend, source if max_pages is None else None)
+    if max_pages is not None:
+        with extractor.open(source) as document:
+            for text in extractor.page_texts(document, 0, max_pages):
+                if stats is not None:
+                    stats.count("pages")
+                    if not text:
+                        stats.count("empty_pages")
+                yield text
+        return
+
+    with extractor.open(source) as document:
+        page_count = extractor.page_count(document)
+        workers = resolve_workers(workers)
+        if stats is not None:
+            stats.count("pages", page_count)
+
+        if workers == 1 or page_count < PARALLEL_MIN_PAGES:
+            for text in extractor.page_texts(document):
+                if not text and stats is not None:
+                    stats.count("empty_pages")
+                yield text
+            return
+
+    spooled = None
+    if not isinstance(source, (str, os.PathLike)):
+        if not isinstance(source, (bytes, bytearray, memoryview)):
+            source.seek(0)
+        source = spooled = spool_to_file(source)
+    ranges = page_ranges(page_count, workers * CHUNKS_PER_WORKER)
+    pool = process_pool(workers, initializer=_init_worker, initargs=(os.fspath(source), extractor.name))
+    try:
+        # map() hands results back in submission order, i.e. page order
+        results = pool.map(_extract_page_range, [r[0] for r in ranges], [r[1] for r in ranges])
+        for page_texts in results:
+            for text in page_texts:
+                if not text and stats is not None:
+                    stats.count("empty_pages")
+                yield text
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        if spooled is not None:
+            os.remove(spooled)
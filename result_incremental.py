@@ -0,0 +1,225 @@
+import hashlib
+import os
+from contextlib import contextmanager
+
+from result_export import format_from_path
+from result_extract import iter_leading_pages, open_pdf, page_content_hash, page_text
+from result_metrics import stage
+from result_parser import LedgerScanner
+from result_store import fingerprint, record_values, student_key
+from result_table import StudentTable
+
+# Marks the start of a student record; pages without it continue the record of an earlier page
+HEADER_MARK = "SEAT NO.:"
+
+# Columns of the delta report
+DELTA_COLUMNS = ["Source", "Change", "Seat No.", "PRN", "Name of Student", "Changes"]
+
+@contextmanager
+def open_ledger_pages(source):
+    """
+    Yield (page content hashes, text(index)) for a ledger: PDF bytes, a PDF path, a binary
+    file object or the path of a text dump (which counts as a single page). Hashes are
+    computed without extracting any text; text(index) extracts one page on demand.
+    """
+    if isinstance(source, (str, os.PathLike)) and os.fspath(source).lower().endswith(".txt"):
+        with open(source, "r", encoding="utf-8") as f:
+            text = f.read()
+        yield [hashlib.sha256(text.encode()).hexdigest()], lambda index: text
+        return
+    with open_pdf(source) as reader:
+        pages = list(iter_leading_pages(reader))
+        hashes = [page_content_hash(reader, page) for page in pages]
+        yield hashes, lambda index: page_text(reader, pages[index]) or ""
+
+def changed_windows(changed, text):
+    """
+    Return the (first, last) page ranges to parse so that every student with a line on a
+    changed page is read whole.
+
+    Each run of changed pages is widened back to the nearest page with a student header
+    (where the record running into the run starts) and forward to the next page with a
+    header (which closes the last record of the run); overlapping ranges are merged.
+    text(index) is only called for the pages next to a run.
+    """
+    windows = []
+    count = len(changed)
+    i = 0
+    while i < count:
+        if not changed[i]:
+            i += 1
+            continue
+        first = i
+        while i < count and changed[i]:
+            i += 1
+        last = i - 1
+        while first > 0:
+            first -= 1
+            if HEADER_MARK in text(first):
+                break
+        while last < count - 1:
+            last += 1
+            if HEADER_MARK in text(last):
+                break
+        if windows and first <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(last, windows[-1][1]))
+        else:
+            windows.append((first, last))
+    return windows
+
+def _show(value):
+    if value is None:
+        return "-"
+    if isinstance(value, tuple):
+        mark, maximum = value
+        return mark if maximum is None else f"{mark}/{maximum}"
+    return str(value)
+
+def describe_changes(old, new):
+    """
+    Describe the differences between two record_values() dicts, e.g. "DBMS (Total): 045/100 -> 052/100".
+    """
+    parts = []
+    for name in dict.fromkeys(list(new) + list(old)):
+        before, after = old.get(name), new.get(name)
+        if before != after:
+            parts.append(f"{name}: {_show(before)} -> {_show(after)}")
+    return "; ".join(parts)
+
+def ingest_incremental(store, source, label, stats=None, name=None):
+    """
+    Apply a ledger to the ledger stored under `label` in a result_store.StudentStore,
+    reading only what changed, and return a delta report.
+
+    Pages whose content hash is already stored with the ledger are skipped before any text
+    is extracted; the other pages are extracted and parsed together with the neighbouring
+    pages their records run into (see changed_windows). Each parsed student is matched by
+    PRN (or seat number) against the stored ones and compared by fingerprint: new students
+    are inserted, changed ones replaced, and nothing is deleted, since supplementary
+    ledgers list only some of the students. Without a stored ledger, the whole file is
+    read and stored as a new ledger with its page hashes.
+
+    The report is a dict with the page and student counts and `rows`, one dict per
+    inserted or changed student (DELTA_COLUMNS).
+    """
+    name = name or (os.fspath(source) if isinstance(source, (str, os.PathLike)) else "upload")
+    ledger_id = store.find_ledger(label)
+    known_pages = store.page_index(ledger_id) if ledger_id is not None else {}
+
+    with open_ledger_pages(source) as (hashes, extract):
+        texts = {}
+
+        def text(index):
+            if index not in texts:
+                with stage(stats, "extract"):
+                    texts[index] = extract(index)
+            return texts[index]
+
+        changed = [content_hash not in known_pages for content_hash in hashes]
+        windows = changed_windows(changed, text)
+
+        # Lines before the first header of a range belong to a record that doesn't touch a
+        # changed page; the scanner counts them as orphan lines and drops them.
+        scanner = LedgerScanner(stats=stats)
+        completed = []
+        touched = set()
+        page_keys = {}
+        for first, last in windows:
+            for index in range(first, last + 1):
+                lines = text(index).splitlines()
+                del texts[index]
+                on_page = {}
+                if scanner.current is not None:
+                    on_page[id(scanner.current)] = scanner.current
+                scanner.page = index + 1
+                with stage(stats, "parse"):
+                    for record in scanner.feed(lines):
+                        completed.append(record)
+                        on_page[id(record)] = record
+                if scanner.current is not None:
+                    on_page[id(scanner.current)] = scanner.current
+                if changed[index]:
+                    touched.update(on_page)
+                    page_keys[hashes[index]] = [student_key(record) for record in on_page.values()]
+            record = scanner.finish()
+            if record is not None and last == len(hashes) - 1:
+                completed.append(record)
+
+    parsed = [record for record in completed if id(record) in touched]
+    from result_marks import compute_totals
+    with stage(stats, "totals"):
+        table = compute_totals(StudentTable.from_records(parsed))
+    if stats is not None:
+        stats.count("pages", len(hashes))
+        stats.count("skipped_pages", changed.count(False))
+        stats.count("records", len(table))
+
+    with stage(stats, "diff"):
+        existing = store.fingerprints(ledger_id) if ledger_id is not None else {}
+        updates = StudentTable()
+        ids = []
+        rows = []
+        replaced = []
+        parsed_keys = set()
+        for record in table.records():
+            key = student_key(record)
+            if key in parsed_keys:
+                continue  # the same student twice in one file: the first one counts
+            parsed_keys.add(key)
+            values = record_values(record)
+            stored = existing.get(key)
+            if stored is not None and stored[1] == fingerprint(values):
+                continue
+            updates.append(record)
+            ids.append(stored[0] if stored is not None else None)
+            rows.append({
+                "Source": name,
+                "Change": "inserted" if stored is None else "changed",
+                "Seat No.": record.get("Seat No.", "-"),
+                "PRN": record.get("PRN", "-"),
+                "Name of Student": record.get("Name of Student", "-"),
+                "Changes": "",
+            })
+            if stored is not None:
+                replaced.append((len(rows) - 1, stored[0], values))
+        old_values = store.student_values([student_id for _, student_id, _ in replaced])
+        for row, student_id, values in replaced:
+            rows[row]["Changes"] = describe_changes(old_values.get(student_id, {}), values)
+
+    with stage(stats, "store"):
+        ledger_id = store.apply_changes(ledger_id, updates, ids, page_keys, source=name, label=label)
+
+    # Students listed only on skipped pages are unchanged by definition
+    skipped_keys = set()
+    for content_hash, is_changed in zip(hashes, changed):
+        if not is_changed:
+            skipped_keys.update(known_pages[content_hash])
+    inserted = sum(row["Change"] == "inserted" for row in rows)
+    return {
+        "ledger_id": ledger_id,
+        "source": name,
+        "pages": len(hashes),
+        "pages_skipped": changed.count(False),
+        "students_parsed": len(table),
+        "inserted": inserted,
+        "changed": len(rows) - inserted,
+        "unchanged": len(table) - len(rows) + len(skipped_keys - parsed_keys),
+        "rows": rows,
+    }
+
+DELTA_WRITERS = {
+    "xlsx": lambda frame, output: frame.to_excel(output, index=False),
+    "csv": lambda frame, output: frame.to_csv(output, index=False),
+    "parquet": lambda frame, output: frame.to_parquet(output, index=False),
+    "arrow": lambda frame, output: frame.to_feather(output),
+}
+
+def write_delta_report(reports, output, fmt=None):
+    """
+    Write the inserted and changed students of one or more delta reports as one table.
+    """
+    import pandas as pd
+    if fmt is None:
+        fmt = format_from_path(output)
+    rows = [row for report in reports for row in report["rows"]]
+    DELTA_WRITERS[fmt](pd.DataFrame(rows, columns=DELTA_COLUMNS), output)
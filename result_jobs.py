@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Jobs running at the same time in this process, shared by every session (LEDGER_JOB_WORKERS)
+DEFAULT_MAX_JOBS = 2
+
+# Finished jobs are forgotten this long after they end, so abandoned results don't pile up
+JOB_TTL_SECONDS = 60 * 60
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """
+    One background task and its progress.
+
+    The task updates pages_done / page_count and students through progress() while it
+    runs; any thread can read them (and state, result, error) to show where it is.
+    """
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.state = QUEUED
+        self.page_count = 0
+        self.pages_done = 0
+        self.students = 0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.exception = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def done(self):
+        return self.state in FINISHED_STATES
+
+    def progress(self, pages_done=None, page_count=None, students=None, message=None):
+        """
+        Record progress; raises JobCancelled if the job was cancelled, so long tasks stop
+        at their next progress report.
+        """
+        if pages_done is not None:
+            self.pages_done = pages_done
+        if page_count is not None:
+            self.page_count = page_count
+        if students is not None:
+            self.students = students
+        if message is not None:
+            self.message = message
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def fraction(self):
+        """
+        Share of the pages processed so far (0 to 1), or None while the page count is unknown.
+        """
+        if self.state == DONE:
+            return 1.0
+        if not self.page_count:
+            return None
+        return min(self.pages_done / self.page_count, 1.0)
+
+    def cancel(self):
+        """
+        Ask the job to stop: a queued job ends as soon as a worker picks it up, a running
+        one at its next progress report.
+        """
+        self._cancel.set()
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+class JobQueue:
+    """
+    Runs jobs on a pool of at most max_workers threads and keeps them by id.
+
+    submit(kind, function, *args) returns a Job at once; the pool calls function(job, *args)
+    and stores its return value in job.result (or the exception and its traceback in
+    job.exception and job.error). Jobs beyond the limit wait in the queue. The CPU-heavy
+    extraction inside a job can still use its own worker processes (see
+    result_extract.iter_pdf_pages).
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_JOBS, ttl=JOB_TTL_SECONDS):
+        self.max_workers = max_workers
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ledger-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, function, *args, cleanup=None):
+        """
+        Queue function(job, *args) and return its Job. cleanup() is called once the job has
+        ended in any state, including when it is cancelled before it starts.
+        """
+        self._forget_expired()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, function, args, cleanup)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def active(self):
+        """
+        Return the number of (queued, running) jobs.
+        """
+        jobs = self.jobs()
+        return sum(job.state == QUEUED for job in jobs), sum(job.state == RUNNING for job in jobs)
+
+    def shutdown(self, wait=True):
+        for job in self.jobs():
+            if not job.done:
+                job.cancel()
+        self._pool.shutdown(wait=wait)
+
+    def _run(self, job, function, args, cleanup):
+        try:
+            if job._cancel.is_set():
+                job.state = CANCELLED
+                return
+            job.state = RUNNING
+            job.started = time.time()
+            job.result = function(job, *args)
+            job.state = DONE
+        except JobCancelled:
+            job.state = CANCELLED
+        except Exception as e:
+            job.exception = e
+            job.error = traceback.format_exc(limit=5)
+            job.state = FAILED
+        finally:
+            job.finished = time.time()
+            if cleanup is not None:
+                cleanup()
+
+    def _forget_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.done and job.finished is not None and now - job.finished > self.ttl]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """
+    Return the process-wide job queue, sized by LEDGER_JOB_WORKERS (default DEFAULT_MAX_JOBS).
+    """
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            max_workers = int(os.environ.get("LEDGER_JOB_WORKERS", DEFAULT_MAX_JOBS))
+            _default_queue = JobQueue(max(1, max_workers))
+        return _default_queue
@@ -0,0 +1,302 @@
+# Declarative course-line layouts.
+#
+# A course line is "<code> <course name> * <mark tokens...>". A layout says which of the
+# tokens after "*" hold which field, using these rules:
+#
+#   "marks":        [(field, position, tag, suffix)] the mark at `position` is stored as `field`
+#                   when it contains `tag` or ends with `suffix`; with neither given it is
+#                   always stored
+#   "scan":         [(field, tag, suffix)] a mark containing a rule's tag is claimed by the first
+#                   such rule; each untagged mark then goes to the first rule with its suffix
+#                   that has no mark yet (else the first rule with its suffix), so untagged
+#                   marks fill the fields in rule order; the last mark claimed by a field is stored
+#   "status":       (field, codes) a mark equal to one of codes (PP, FF, ...) is stored as `field`
+#   "labels":       [(field, label)] the token after the last `label` (before the final token)
+#   "first_labels": [(field, label)] the token after the first `label` (before the final token)
+#   "min_marks":    lines with fewer mark tokens than this are ignored
+#
+# Marks are stored without their denominator ("062/100" -> "062"), which is kept in the
+# record's max_marks.
+LAYOUTS = {
+    # Theory: ISE, ESE and Total in the first three positions, then grade, GP, CP and Tot%
+    "theory": {
+        "marks": [(" (Insem)", 0, "ISE", "/030"), (" (ESE)", 1, "ESE", "/070"), (" (Total)", 2, None, "/100")],
+        "labels": [(" (Grade)", "Grd"), (" (GP)", "GP"), (" (CP)", "CP")],
+        "first_labels": [(" (Tot%)", "Tot%")],
+    },
+    # Laboratory practice and project: TW and PR marks anywhere after "*", tagged ("045/050TW")
+    # or plain, in which case two "/050" marks are TW then PR
+    "lab": {
+        "scan": [(" (TW)", "TW", "/050"), (" (PR)", "PR", "/050")],
+    },
+    # MOOC: only a PP/FF status
+    "mooc": {
+        "status": (" (Status)", ("PP", "FF")),
+    },
+}
+
+# Layout profiles. A profile maps course codes to layouts; a code ending in "*" is a prefix
+# ("410249*" matches 410249A, 410249B, ...). A course may give a `label`, in which case its
+# columns are "<label><field>"; otherwise the caller names the columns (e.g. after the course
+# name). Courses whose code isn't listed are matched by `names` (substrings of the upper-cased
+# course name) and then get the `default` layout; with no default they are skipped.
+PROFILES = {
+    # Any SPPU ledger: the layout follows from the course name, columns are named after it
+    "sppu": {
+        "courses": [],
+        "names": [(("LABORATORY PRACTICE", "PROJECT"), "lab"), (("MOOC",), "mooc")],
+        "default": "theory",
+    },
+    # B.E. (2019 pattern) Information Technology, Sem. VII, with fixed positions and short column names
+    "be-it-2019": {
+        "courses": [
+            {"codes": ["410241"], "label": "DAA", "layout": "fixed-theory"},
+            {"codes": ["410242"], "label": "ML", "layout": "fixed-theory"},
+            {"codes": ["410243"], "label": "BCT", "layout": "fixed-theory"},
+            {"codes": ["410244", "410244D"], "label": "OOMD", "layout": "fixed-theory"},
+            {"codes": ["410245", "410245D"], "label": "STQA", "layout": "fixed-theory"},
+            {"codes": ["410246"], "label": "LP-III",
+             "layout": {"marks": [(" (TW)", 3, None, None), (" (PR)", 4, None, None)], "min_marks": 5}},
+            {"codes": ["410247"], "label": "LP-IV", "layout": {"marks": [(" (TW)", 3, None, None)], "min_marks": 4}},
+            {"codes": ["410248"], "label": "PROJECT", "layout": {"marks": [(" (TW)", 3, None, None)], "min_marks": 4}},
+            {"codes": ["410249*"], "label": "MOOC", "layout": {"marks": [("", 3, None, None)], "min_marks": 4}},
+        ],
+        "layouts": {
+            "fixed-theory": {
+                "marks": [(" (Insem)", 0, None, None), (" (ESE)", 1, None, None), (" (Total)", 2, None, None)],
+                "min_marks": 3,
+            },
+        },
+        "default": None,
+    },
+}
+
+DEFAULT_PROFILE = "sppu"
+
+def _store_mark(student, column, token):
+    """
+    Store the mark part of a token such as "062/100" and remember its maximum ("100").
+    """
+    mark, _, maximum = token.partition("/")
+    student[column] = mark
+    if maximum:
+        student.max_marks[column] = maximum
+
+# A tag no token contains (tokens are split on whitespace)
+NO_TAG = "\n"
+
+def _compile_mark_rule(field, position, tag, suffix):
+    """
+    Return a "marks" rule whose token test is just `tag in token or token.endswith(suffix)`:
+    a rule with neither a tag nor a suffix gets the tag "" (every token contains it), a
+    missing tag becomes NO_TAG and a missing suffix the empty tuple (which nothing ends with).
+    """
+    if tag is None and suffix is None:
+        return field, position, "", ()
+    return field, position, NO_TAG if tag is None else tag, () if suffix is None else suffix
+
+class CourseLayout:
+    """
+    A compiled layout: stores the fields of one course line on a student record.
+
+    `columns` maps each field to its column name when the profile gives the course a label;
+    otherwise the caller passes its own mapping to store().
+    """
+
+    __slots__ = ("name", "label", "fields", "columns", "marks", "scan", "status", "labels",
+                 "first_labels", "min_marks")
+
+    def __init__(self, name, spec, label=None):
+        self.name = name
+        self.label = label
+        self.marks = tuple(_compile_mark_rule(*rule) for rule in spec.get("marks", ()))
+        self.scan = tuple((field, tag, () if suffix is None else suffix)
+                          for field, tag, suffix in spec.get("scan", ()))
+        status = spec.get("status")
+        self.status = (status[0], frozenset(status[1])) if status else None
+        self.labels = tuple(tuple(rule) for rule in spec.get("labels", ()))
+        self.first_labels = tuple(tuple(rule) for rule in spec.get("first_labels", ()))
+        self.min_marks = spec.get("min_marks", 0)
+
+        fields = [rule[0] for rule in self.marks + self.scan]
+        if self.status:
+            fields.append(self.status[0])
+        fields.extend(rule[0] for rule in self.labels + self.first_labels)
+        self.fields = tuple(dict.fromkeys(fields))
+        self.columns = {field: label + field for field in self.fields} if label is not None else None
+
+    def project(self, fields):
+        """
+        Return a copy of this layout that only stores the given fields (self if it has no
+        others), so the tokens of the other fields aren't looked at. Scan rules are all kept,
+        since each one claims tokens the later rules would otherwise match; store() only
+        stores the fields present in its column mapping.
+        """
+        if all(field in fields for field in self.fields):
+            return self
+        layout = CourseLayout.__new__(CourseLayout)
+        layout.name = self.name
+        layout.label = self.label
+        layout.marks = tuple(rule for rule in self.marks if rule[0] in fields)
+        layout.scan = self.scan if any(rule[0] in fields for rule in self.scan) else ()
+        layout.status = self.status if self.status and self.status[0] in fields else None
+        layout.labels = tuple(rule for rule in self.labels if rule[0] in fields)
+        layout.first_labels = tuple(rule for rule in self.first_labels if rule[0] in fields)
+        layout.min_marks = self.min_marks
+        layout.fields = tuple(field for field in self.fields if field in fields)
+        layout.columns = ({field: column for field, column in self.columns.items() if field in fields}
+                          if self.columns is not None else None)
+        return layout
+
+    def store(self, student, columns, tokens, star_index):
+        """
+        Store the fields of a course line (split into tokens, "*" at star_index) on student.
+        """
+        marks = tokens[star_index+1:]
+        if len(marks) < self.min_marks:
+            return
+        self.store_marks(student, columns, marks)
+
+        if self.labels or self.first_labels:
+            end = len(tokens) - 1
+            if self.labels:
+                # The last `label` before the final token is the first one in the reversed tokens
+                backwards = tokens[end-1::-1]
+                for field, label in self.labels:
+                    try:
+                        value_index = end - backwards.index(label)
+                    except ValueError:
+                        continue
+                    student[columns[field]] = tokens[value_index]
+            for field, label in self.first_labels:
+                if label in tokens:
+                    try:
+                        student[columns[field]] = tokens[tokens.index(label, 0, end) + 1]
+                    except ValueError:
+                        pass
+
+    def store_marks(self, student, columns, marks):
+        """
+        Store the fields read from the mark tokens after "*" (the marks, scan and status rules).
+        """
+        n_marks = len(marks)
+        for field, position, tag, suffix in self.marks:
+            if position < n_marks:
+                token = marks[position]
+                if tag in token or token.endswith(suffix):
+                    # _store_mark, inlined: this runs for every mark of every theory line
+                    column = columns[field]
+                    mark, _, maximum = token.partition("/")
+                    student[column] = mark
+                    if maximum:
+                        student.max_marks[column] = maximum
+
+        if self.scan:
+            claimed = [None] * len(self.scan)
+            untagged = []
+            for token in marks:
+                for i, (_, tag, _) in enumerate(self.scan):
+                    if tag in token:
+                        claimed[i] = token
+                        break
+                else:
+                    untagged.append(token)
+            for token in untagged:
+                fits = [i for i, (_, _, suffix) in enumerate(self.scan) if token.endswith(suffix)]
+                if fits:
+                    free = [i for i in fits if claimed[i] is None]
+                    claimed[(free or fits)[0]] = token
+            for (field, _, _), token in zip(self.scan, claimed):
+                if token is not None and field in columns:
+                    _store_mark(student, columns[field], token)
+
+        if self.status:
+            field, codes = self.status
+            for token in marks:
+                mark = token.partition("/")[0]
+                if mark in codes:
+                    student[columns[field]] = mark
+
+class LayoutTable:
+    """
+    A profile compiled into a dispatch table: course code -> CourseLayout.
+
+    Exact codes are a dict lookup and prefixes are looked up by slicing the code to each
+    prefix length in use (longest first), so resolving a code costs a few dict lookups
+    however many courses the profile lists. Resolved codes are memoized.
+    """
+
+    def __init__(self, profile=DEFAULT_PROFILE):
+        if isinstance(profile, str):
+            profile = PROFILES[profile]
+        layouts = dict(LAYOUTS, **profile.get("layouts", {}))
+
+        def compile_layout(layout, label=None):
+            if isinstance(layout, str):
+                return CourseLayout(layout, layouts[layout], label)
+            return CourseLayout(label or "custom", layout, label)
+
+        self.exact = {}
+        self.prefixes = {}
+        self.courses = []
+        for course in profile.get("courses", ()):
+            layout = compile_layout(course["layout"], course.get("label"))
+            self.courses.append(layout)
+            for code in course["codes"]:
+                if code.endswith("*"):
+                    self.prefixes[code[:-1]] = layout
+                else:
+                    self.exact[code] = layout
+        self.prefix_lengths = sorted({len(prefix) for prefix in self.prefixes}, reverse=True)
+        self.names = [(tuple(words), compile_layout(layout)) for words, layout in profile.get("names", ())]
+        default = profile.get("default")
+        self.default = compile_layout(default) if default else None
+        self._resolved = {}
+
+    def for_code(self, code):
+        """
+        Return the layout listed for a course code (exactly or by prefix), or None.
+        """
+        try:
+            return self._resolved[code]
+        except KeyError:
+            pass
+        layout = self.exact.get(code)
+        if layout is None:
+            for length in self.prefix_lengths:
+                layout = self.prefixes.get(code[:length])
+                if layout is not None:
+                    break
+        self._resolved[code] = layout
+        return layout
+
+    def lookup(self, code, name=""):
+        """
+        Return the layout for a course: by code, then by course name, then the default (may be None).
+        """
+        layout = self.for_code(code)
+        if layout is not None:
+            return layout
+        upper = name.upper()
+        for words, layout in self.names:
+            for word in words:
+                if word in upper:
+                    return layout
+        return self.default
+
+    def columns(self):
+        """
+        Return the column names of the labelled courses, in profile order.
+        """
+        return [column for layout in self.courses if layout.columns for column in layout.columns.values()]
+
+_tables = {}
+
+def get_layout_table(profile=DEFAULT_PROFILE):
+    """
+    Return the compiled LayoutTable of a named profile, compiling it on first use.
+    """
+    table = _tables.get(profile)
+    if table is None:
+        table = _tables[profile] = LayoutTable(profile)
+    return table
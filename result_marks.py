@@ -0,0 +1,76 @@
+import numpy as np
+
+# Fields that count towards a student's Total and %, with the maximum used when the ledger
+# doesn't print a denominator (e.g. "/100") for the mark
+COUNTED_FIELDS = {" (Total)": 100, " (TW)": 50, " (PR)": 50}
+
+# Every field that holds a mark out of a printed maximum
+MARK_FIELDS = (" (Insem)", " (ESE)", " (Total)", " (TW)", " (PR)")
+
+# A counted mark below this share of its maximum, or one of FAIL_CODES, fails the student
+PASS_FRACTION = 0.4
+FAIL_CODES = ["AB", "FF"]
+
+def field_of(column):
+    """
+    Return the " (Field)" suffix of a subject column, e.g. " (Total)".
+    """
+    return column[column.rfind(" ("):]
+
+def numeric_marks(values):
+    """
+    Convert raw mark strings to a float array; "-", "AB", "FF" and other non-numbers become NaN.
+    """
+    # Marks repeat a lot (000-100, AB, ...), so each distinct value is converted only once
+    lookup = {}
+    for value in set(values):
+        try:
+            lookup[value] = float(value)
+        except (TypeError, ValueError):
+            lookup[value] = np.nan
+    return np.fromiter(map(lookup.__getitem__, values), dtype=float, count=len(values))
+
+def max_marks(table, column, default=np.nan):
+    """
+    Return the maximum marks of a column as a float array, using `default` where none was printed.
+    """
+    maxima = numeric_marks(table.max_marks_column(column))
+    return np.where(np.isnan(maxima), default, maxima)
+
+def compute_totals(table):
+    """
+    Fill the Total, % and Result columns of a StudentTable in one vectorized pass over the cohort.
+
+    Total adds up every numeric (Total), (TW) and (PR) mark and % divides it by the sum of
+    those marks' own maximum marks as printed in the ledger (/100, /050, ...), falling back to
+    COUNTED_FIELDS when a mark has no denominator. Result is FAIL when any counted mark is AB
+    or FF or below PASS_FRACTION of its maximum, or a (Status) is FF; PASS otherwise.
+    """
+    rows = len(table)
+    total = np.zeros(rows)
+    maximum = np.zeros(rows)
+    failed = np.zeros(rows, dtype=bool)
+
+    for column in list(table.columns):
+        field = field_of(column)
+        if field == " (Status)":
+            failed |= np.asarray(table.column(column), dtype=object) == "FF"
+            continue
+        default = COUNTED_FIELDS.get(field)
+        if default is None:
+            continue
+        raw = table.column(column)
+        values = numeric_marks(raw)
+        maxima = max_marks(table, column, default)
+        counted = ~np.isnan(values)
+        total += np.where(counted, values, 0)
+        maximum += np.where(counted, maxima, 0)
+        failed |= np.isin(np.asarray(raw, dtype=object), FAIL_CODES)
+        failed |= counted & (values < PASS_FRACTION * maxima)
+
+    has_marks = maximum > 0
+    percent = np.divide(total, maximum, out=np.zeros(rows), where=has_marks) * 100
+    table.set_column("Total", [str(int(t)) if h else "" for t, h in zip(total.tolist(), has_marks.tolist())])
+    table.set_column("%", [str(round(p, 2)) if h else "" for p, h in zip(percent.tolist(), has_marks.tolist())])
+    table.set_column("Result", np.where(failed, "FAIL", np.where(has_marks, "PASS", "")).tolist())
+    return table
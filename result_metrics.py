@@ -0,0 +1,136 @@
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Parse-quality counters, in display order
+COUNTERS = [
+    "pages",                   # PDF pages read
+    "empty_pages",             # pages without any extracted text
+    "skipped_pages",           # pages skipped by content hash in incremental runs
+    "lines",                   # text lines seen by the scanner
+    "blank_lines",
+    "skipped_lines",           # page header/footer lines (COURSE NAME, PAGE :-, COLLEGE:, ...)
+    "header_lines",            # SEAT NO. lines
+    "sgpa_lines",
+    "course_lines",            # course lines stored on a student
+    "profiled_course_lines",   # of those, lines read by the positions of a learned layout profile
+    "unmatched_course_lines",  # lines that look like course lines but have no "*" token
+    "unselected_course_lines", # course lines of subjects left out by a projection (--only-selected)
+                               # or not listed by a layout profile without a default
+    "orphan_lines",            # SGPA/course lines before the first SEAT NO. header
+    "other_lines",             # lines matching none of the above
+    "records",                 # student records produced
+    "anomalies",               # records failing a consistency check (see result_validate.CHECKS)
+]
+
+def _peak_rss_mb():
+    """
+    Return the peak resident memory of this process so far in MB, or None where unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def stage(stats, name):
+    """
+    stats.stage(name), or a no-op context when stats is None (instrumentation is optional).
+    """
+    return nullcontext() if stats is None else stats.stage(name)
+
+def timed(iterable, stats, name):
+    """
+    Return an iterator over iterable that counts the time spent producing each item towards
+    stage `name`, for lazy stages such as page extraction that run interleaved with their
+    consumer. Without stats the items are passed through untimed.
+    """
+    if stats is None:
+        return iter(iterable)
+    return _timed(iter(iterable), stats, name)
+
+def _timed(iterator, stats, name):
+    while True:
+        with stats.stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+class PipelineStats:
+    """
+    Wall time and memory per pipeline stage plus parse-quality counters for one ledger run.
+
+    Stages are timed with `with stats.stage("parse"):`. Time spent in a stage entered while
+    another is running (e.g. PDF pages extracted lazily while the scanner pulls them) is
+    counted for the inner stage only, so stage times add up to the total. Memory is the
+    process's peak RSS when the stage ends and how much that peak grew during the stage.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._nested = []
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        rss_before = _peak_rss_mb()
+        self._nested.append(0.0)
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - started
+            inner = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            rss_after = _peak_rss_mb()
+            entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_rss_mb": None,
+                                                  "rss_growth_mb": 0.0})
+            entry["seconds"] += elapsed - inner
+            entry["calls"] += 1
+            if rss_after is not None:
+                entry["peak_rss_mb"] = rss_after
+                entry["rss_growth_mb"] += rss_after - rss_before
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, other):
+        """
+        Add another run's stage times and counters to this one (e.g. for a batch total).
+        """
+        other = other.to_dict() if isinstance(other, PipelineStats) else other
+        for name, value in other["counters"].items():
+            self.count(name, value)
+        for name, entry in other["stages"].items():
+            mine = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_rss_mb": None,
+                                                 "rss_growth_mb": 0.0})
+            mine["seconds"] += entry["seconds"]
+            mine["calls"] += entry["calls"]
+            mine["rss_growth_mb"] += entry["rss_growth_mb"]
+            if entry["peak_rss_mb"] is not None:
+                mine["peak_rss_mb"] = max(mine["peak_rss_mb"] or 0, entry["peak_rss_mb"])
+        return self
+
+    def to_dict(self):
+        stages = {}
+        for name, entry in self.stages.items():
+            peak = entry["peak_rss_mb"]
+            stages[name] = {
+                "seconds": round(entry["seconds"], 4),
+                "calls": entry["calls"],
+                "peak_rss_mb": None if peak is None else round(peak, 1),
+                "rss_growth_mb": round(entry["rss_growth_mb"], 1),
+            }
+        return {"stages": stages, "counters": dict(self.counters)}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
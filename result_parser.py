@@ -0,0 +1,464 @@
+import re
+from itertools import chain, islice
+from result_layouts import get_layout_table
+from result_metrics import stage
+from result_table import StudentRecord, StudentTable
+
+# Pure-Python parsing core: ledger text in, student records out. Nothing here imports
+# pandas, PyPDF2 or Streamlit, so CLI and worker processes can use it without paying for
+# them; PDF extraction lives in result_extract and exports in result_export.
+
+def clean_mark(token):
+    """
+    If token contains '/', return only the part before the slash.
+    Otherwise, return the token as is.
+    """
+    if "/" in token:
+        return token.split("/")[0]
+    return token
+
+HEADER_REGEX = re.compile(
+    r"SEAT NO\.\:\s*(\S+)\s*NAME\s*:\s*(.*?)\s*MOTHER\s*:\s*(.*?)\s*PRN\s*:\s*(\S+)\s*CLG\.\:\s*(\S+)"
+)
+
+# Line yielded by iter_lines before each page; LedgerScanner counts them to number the pages
+PAGE_BREAK = "\f"
+
+def iter_lines(pages):
+    """
+    Yield the lines of each page text in page order without joining the pages together,
+    each page preceded by a PAGE_BREAK line.
+    """
+    for page_text in pages:
+        yield PAGE_BREAK
+        yield from page_text.splitlines()
+
+def text_lines(text):
+    """
+    Yield the lines of one ledger text (e.g. extract_text_from_pdf output, which has no page
+    breaks) one at a time, without splitting the whole text into a list first.
+    """
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end < 0:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+def auto_detect_subjects(text):
+    """
+    Auto-detect subject base names from lines that start with a course code and contain a '*' token.
+    Returns a list of base subject names.
+    """
+    return auto_detect_subjects_from_lines(text_lines(text))
+
+def auto_detect_subjects_from_lines(lines, stats=None):
+    """
+    Same as auto_detect_subjects, but reads the lines from any iterable (e.g. iter_lines(pages)).
+    With a result_metrics.PipelineStats, the time is recorded as the "detect" stage.
+
+    Only course lines are looked at, and only up to their "*": the subjects are the ones
+    LedgerScanner collects, without classifying the other lines or building records.
+    """
+    # "<code> <course name>" part of a course line -> its base subject name
+    names = {}
+    with stage(stats, "detect"):
+        for line in lines:
+            line = line.strip()
+            if not line or not line[0].isdecimal() or "*" not in line:
+                continue
+            if "SEAT NO.:" in line and HEADER_REGEX.search(line, line.find("SEAT NO.:")):
+                continue
+            star = line.find("*")
+            if line[star-1:star+2] == " * ":
+                code_and_name = line[:star]
+            else:
+                # The first "*" is inside a token or not followed by a space: split like the scanner
+                tokens = line.split()
+                if "*" not in tokens:
+                    continue
+                code_and_name = " ".join(tokens[:tokens.index("*")])
+            if code_and_name not in names:
+                names[code_and_name] = " ".join(code_and_name.split()[1:])
+    return list(dict.fromkeys(name for name in names.values() if name))
+
+def new_student():
+    return StudentRecord({
+        "Seat No.": "-",
+        "Name of Student": "-",
+        "Mother's Name": "-",
+        "PRN": "-",
+        "College Code": "-",
+        "SGPA": "-",
+        "Total Credits": "-",
+        "CGPA": "-",
+        "Total": "",
+        "%": ""
+    })
+
+def finalize_student(student):
+    """
+    Fill in the per-student fields that are known once all its lines have been read.
+    Total, % and Result depend on the mark columns and are computed for the whole cohort
+    at once by result_marks.compute_totals.
+    """
+    student["CGPA"] = student["SGPA"]
+    return student
+
+def parse_student_file_from_text(text, subjects=None, fields=None):
+    """
+    Parse the extracted text from the PDF and return a list of student dictionaries.
+    Student records are built dynamically by adding keys for each subject encountered.
+    subjects and fields restrict what is extracted (see LedgerScanner).
+    The records are those of scan_ledger's StudentTable, so Total, % and Result come from
+    the same result_marks.compute_totals pass over the cohort.
+    """
+    _, students = scan_ledger(text_lines(text), subjects=subjects, fields=fields)
+    return list(students.records())
+
+def iter_students(lines):
+    """
+    Parse ledger lines and yield one student dictionary at a time.
+    A record is yielded as soon as the next SEAT NO. header (or the end of input) closes it,
+    so only the student currently being read is held in memory. Total, % and Result are left
+    for result_marks.compute_totals, which fills them for a whole StudentTable.
+    """
+    return LedgerScanner().scan(lines)
+
+def scan_ledger(lines, stats=None, progress=None, subjects=None, fields=None, profiles=None):
+    """
+    Read the ledger lines once and return (detected subjects, StudentTable of the students),
+    with Total, % and Result computed for the whole cohort. With subjects and/or fields only
+    those columns are extracted (see LedgerScanner), and Total, % and Result then only count
+    the marks that were extracted.
+
+    The first lines are fingerprinted first: a ledger of a known format is read with its
+    learned layout profile, and the profile of a new format is learned while it is read
+    (see result_profiles), unless only some subjects or fields are extracted. profiles is
+    the result_profiles.ProfileStore to use (default: the shared one).
+    Pass a result_metrics.PipelineStats to record the stage times and line counters; subjects
+    are detected in the same pass as the records, so detection is timed as part of "parse".
+    progress(students parsed) is called every PROGRESS_EVERY students.
+    """
+    scanner, records = _profiled_scan(lines, profiles, stats=stats, subjects=subjects, fields=fields)
+    if progress is not None:
+        records = _reporting(records, progress)
+    with stage(stats, "parse"):
+        table = StudentTable.from_records(records)
+    # numpy is only needed once there are students to total
+    from result_marks import compute_totals
+    with stage(stats, "totals"):
+        students = compute_totals(table)
+    if stats is not None:
+        stats.count("records", len(students))
+    return scanner.subjects, students
+
+def _profiled_scan(lines, profiles=None, **options):
+    """
+    Fingerprint the first lines and return (LedgerScanner, iterator over its records): a
+    ledger of a known format is read with its learned layout profile, and the profile of a
+    new format is learned while it is read and stored once the records run out, unless only
+    some subjects or fields are extracted (see result_profiles). options go to LedgerScanner.
+    """
+    from result_profiles import FINGERPRINT_LINES, get_profile_store, ledger_fingerprint
+    if profiles is None:
+        profiles = get_profile_store()
+    lines = iter(lines)
+    head = list(islice(lines, FINGERPRINT_LINES))
+    fingerprint = ledger_fingerprint(head)
+    profile = profiles.get(fingerprint) if fingerprint is not None else None
+    learn = fingerprint is not None and profile is None \
+        and options.get("subjects") is None and options.get("fields") is None
+    scanner = LedgerScanner(profile=profile, learn=learn, **options)
+    return scanner, _learning(scanner, scanner.scan(chain(head, lines)), profiles, fingerprint)
+
+def _learning(scanner, records, profiles, fingerprint):
+    yield from records
+    if scanner.samples is not None:
+        from result_profiles import learn_profile
+        profiles.put(learn_profile(fingerprint, scanner.samples, scanner.layouts))
+
+
+# Students parsed between two progress reports of scan_ledger
+PROGRESS_EVERY = 200
+
+def _reporting(records, progress):
+    for count, record in enumerate(records, 1):
+        if count % PROGRESS_EVERY == 0:
+            progress(count)
+        yield record
+
+# Line kinds produced by LedgerScanner.classify: known page furniture, student header,
+# SGPA line, course line, and anything else (dropped, but counted as "other_lines")
+LINE_SKIP, LINE_HEADER, LINE_SGPA, LINE_COURSE, LINE_OTHER = range(5)
+
+# Page header/footer lines that never carry student data
+SKIP_PREFIXES = ("COURSE NAME", "SEM.:", "............", "PAGE :-", "COLLEGE:", "BRANCH CODE")
+
+SGPA_REGEX = re.compile(r"SGPA1\s*:\s*([\d.]+|--)")
+CREDITS_REGEX = re.compile(r"TOTAL CREDITS EARNED\s*:\s*(\d+)")
+
+# Course lines kept per course code by a learning LedgerScanner (see result_profiles.learn_profile)
+LEARN_SAMPLES = 5
+
+# Line counters kept by LedgerScanner (a subset of result_metrics.COUNTERS)
+SCANNER_COUNTERS = ("lines", "blank_lines", "skipped_lines", "header_lines", "sgpa_lines", "course_lines",
+                    "profiled_course_lines", "unmatched_course_lines", "unselected_course_lines", "orphan_lines",
+                    "other_lines")
+
+SUBJECT_FIELDS = (" (Code)", " (Insem)", " (ESE)", " (Total)", " (TW)", " (PR)", " (Status)",
+                  " (Tot%)", " (Grade)", " (GP)", " (CP)")
+
+class LedgerScanner:
+    """
+    Single pass over ledger lines.
+
+    Every line is classified once as a header, course, SGPA or skipped line, and the same
+    pass both collects the detected subject names (in order of first appearance, in
+    self.subjects) and builds the student records. Per-subject work (the layout lookup in
+    the result_layouts profile and the column names) is done the first time a subject is
+    seen and reused afterwards. With build_records=False only the subjects are collected.
+
+    Course lines for which the layout profile has no layout (a profile without a default)
+    are skipped like the unselected subjects below.
+
+    subjects (base names, matched case-insensitively as prefixes of the column names, like
+    the export's subject selection) and fields (suffixes such as " (Total)") project the
+    records: lines of other subjects are skipped once their course code is known, without
+    being split into tokens, and only the given fields of a line are extracted. Subjects are
+    still detected from every course code's first line.
+
+    With a learned result_profiles.LayoutProfile, each course code the profile knows is
+    compiled when its first line has been read, and later lines with the learned shape are
+    stored by position (counted as "profiled_course_lines"); other lines are read as above.
+    With learn=True, the first LEARN_SAMPLES stored lines of each course code are kept in
+    self.samples to learn a profile from.
+
+    Pages are numbered by the PAGE_BREAK lines iter_lines puts before each page: self.page
+    is 1 after the first one, and each record keeps the page its header was read on (None
+    for lines without page breaks, e.g. a text dump). Callers that feed one page at a time
+    set self.page instead. The "PAGE :-" numbers printed on the pages aren't used.
+
+    Lines that are dropped are counted by reason in self.counts (see result_metrics.COUNTERS);
+    when a PipelineStats is given, the counts are added to it as each feed() finishes.
+    """
+
+    def __init__(self, build_records=True, stats=None, layouts=None, subjects=None, fields=None, profile=None,
+                 learn=False):
+        self.build_records = build_records
+        self.subject_prefixes = tuple(subject.upper() for subject in subjects) if subjects is not None else None
+        self.fields = frozenset(fields) if fields is not None else None
+        self.profile = profile
+        self.samples = {} if learn else None
+        self.stats = stats
+        self.layouts = layouts if layouts is not None else get_layout_table()
+        self.counts = dict.fromkeys(SCANNER_COUNTERS, 0)
+        self.subjects = []
+        self.current = None
+        self.page = None
+        self._seen_subjects = set()
+        # base subject -> (CourseLayout or None, {field suffix: column name}), or (None, None)
+        # for subjects outside the projection, whose course codes go to self._skip_codes
+        self._subject_info = {}
+        self._skip_codes = set()
+        # course code -> result_profiles.LearnedCourse, or None for codes the profile can't read
+        self._learned = {}
+
+    @staticmethod
+    def classify(line):
+        """
+        Return (kind, header match or None) for a stripped, non-empty line.
+        """
+        if line.startswith(SKIP_PREFIXES):
+            return LINE_SKIP, None
+        seat_index = line.find("SEAT NO.:")
+        if seat_index >= 0:
+            header_match = HEADER_REGEX.search(line, seat_index)
+            if header_match:
+                return LINE_HEADER, header_match
+        if line.startswith("SGPA1 :"):
+            return LINE_SGPA, None
+        if line[0].isdecimal() and "*" in line:
+            return LINE_COURSE, None
+        return LINE_OTHER, None
+
+    def scan(self, lines):
+        """
+        Yield every student record in lines, including the last one.
+        """
+        yield from self.feed(lines)
+        student = self.finish()
+        if student is not None:
+            yield student
+
+    def finish(self):
+        """
+        Close and return the record still being read (or None).
+        """
+        student = self.current
+        self.current = None
+        if student is None:
+            return None
+        return finalize_student(student)
+
+    def feed(self, lines):
+        """
+        Consume lines and yield each record as soon as the next header closes it.
+        The record being read when the lines run out stays open until finish().
+        """
+        classify = self.classify
+        build_records = self.build_records
+        current_student = self.current
+        page = self.page
+        # Line counters by kind (LINE_SKIP ... LINE_OTHER), kept in locals on the hot path
+        kind_counts = [0] * 5
+        n_lines = n_pages = n_blank = n_unmatched = n_unselected = n_orphan = n_stored = n_profiled = 0
+        skip_codes = self._skip_codes
+        learned = self._learned if self.profile is not None and build_records else None
+        samples = self.samples
+
+        try:
+            for raw_line in lines:
+                n_lines += 1
+                line = raw_line.strip()
+                if not line:
+                    if raw_line == PAGE_BREAK:
+                        page = 1 if page is None else page + 1
+                        n_pages += 1
+                    else:
+                        n_blank += 1
+                    continue
+                # Most lines are course lines, and no skipped or SGPA line starts with a digit
+                if line[0].isdecimal() and "*" in line and "SEAT NO.:" not in line:
+                    kind = LINE_COURSE
+                else:
+                    kind, header_match = classify(line)
+                kind_counts[kind] += 1
+
+                if kind == LINE_SKIP or kind == LINE_OTHER:
+                    continue
+
+                if kind == LINE_HEADER:
+                    if not build_records:
+                        continue
+                    if current_student is not None:
+                        yield finalize_student(current_student)
+                    current_student = new_student()
+                    current_student.page = page
+                    current_student["Seat No."] = header_match.group(1)
+                    current_student["Name of Student"] = header_match.group(2).strip()
+                    current_student["Mother's Name"] = header_match.group(3).strip()
+                    current_student["PRN"] = header_match.group(4).strip()
+                    current_student["College Code"] = header_match.group(5).strip()
+                    continue
+
+                if kind == LINE_SGPA:
+                    # Nothing can be stored until the first student header has been seen
+                    if current_student is None:
+                        n_orphan += build_records
+                        continue
+                    sgpa_match = SGPA_REGEX.search(line)
+                    tc_match = CREDITS_REGEX.search(line)
+                    if sgpa_match:
+                        current_student["SGPA"] = sgpa_match.group(1)
+                    if tc_match:
+                        current_student["Total Credits"] = tc_match.group(1)
+                    continue
+
+                # Course line
+                if skip_codes and line[:line.find(" ")] in skip_codes:
+                    n_unselected += 1
+                    continue
+                tokens = line.split()
+                if learned:
+                    course = learned.get(tokens[0])
+                    if course is not None and course.matches(tokens):
+                        if current_student is None:
+                            n_orphan += 1
+                            continue
+                        course.store(current_student, tokens)
+                        n_stored += 1
+                        n_profiled += 1
+                        continue
+                try:
+                    star_index = tokens.index("*")
+                except ValueError:
+                    # A "*" inside a token (e.g. "410249*") but no standalone "*" separator
+                    n_unmatched += 1
+                    continue
+                base_subject = " ".join(tokens[1:star_index])
+                info = self._subject_info.get(base_subject)
+                if info is None:
+                    info = self._register_subject(tokens[0], base_subject)
+                if current_student is None:
+                    n_orphan += build_records
+                    continue
+                layout, columns = info
+                if columns is None:
+                    skip_codes.add(tokens[0])
+                    n_unselected += 1
+                    continue
+                # Store course code as a separate field
+                code_column = columns.get(" (Code)")
+                if code_column is not None:
+                    current_student[code_column] = tokens[0]
+                if layout is not None:
+                    layout.store(current_student, columns, tokens, star_index)
+                n_stored += 1
+                if learned is not None and tokens[0] not in learned:
+                    learned[tokens[0]] = self.profile.compile(tokens, base_subject, layout, columns)
+                if samples is not None:
+                    seen = samples.get(tokens[0])
+                    if seen is None:
+                        samples[tokens[0]] = [tokens]
+                    elif len(seen) < LEARN_SAMPLES:
+                        seen.append(tokens)
+
+            self.current = current_student
+            self.page = page
+        finally:
+            # Also runs when the consumer stops early and closes this generator
+            fed = {
+                "lines": n_lines - n_pages,
+                "blank_lines": n_blank,
+                "skipped_lines": kind_counts[LINE_SKIP],
+                "header_lines": kind_counts[LINE_HEADER],
+                "sgpa_lines": kind_counts[LINE_SGPA],
+                "course_lines": n_stored,
+                "profiled_course_lines": n_profiled,
+                "unmatched_course_lines": n_unmatched,
+                "unselected_course_lines": n_unselected,
+                "orphan_lines": n_orphan,
+                "other_lines": kind_counts[LINE_OTHER],
+            }
+            for name, count in fed.items():
+                self.counts[name] += count
+                if self.stats is not None:
+                    self.stats.count(name, count)
+
+    def _register_subject(self, code, base_subject):
+        if base_subject and base_subject not in self._seen_subjects:
+            self._seen_subjects.add(base_subject)
+            self.subjects.append(base_subject)
+        layout = self.layouts.lookup(code, base_subject)
+        if layout is None:
+            # Only a profile without a default layout has none: it skips the courses it doesn't list
+            info = self._subject_info[base_subject] = (None, None)
+            return info
+        if layout is not None and layout.columns is not None:
+            columns = dict(layout.columns)
+            columns[" (Code)"] = layout.label + " (Code)"
+        else:
+            columns = {field: base_subject + field for field in SUBJECT_FIELDS}
+        if self.subject_prefixes is not None \
+                and not columns[" (Code)"][:-len(" (Code)")].upper().startswith(self.subject_prefixes):
+            layout = columns = None
+        elif self.fields is not None:
+            columns = {field: column for field, column in columns.items() if field in self.fields}
+            if layout is not None:
+                layout = layout.project(self.fields)
+        info = (layout, columns)
+        self._subject_info[base_subject] = info
+        return info
@@ -0,0 +1,222 @@
+# Learned layout profiles.
+#
+# Most ledgers come in a handful of formats: the same branch and pattern print the same course
+# codes, names and token positions on every course line. A ledger's format is fingerprinted
+# from its page header lines (BRANCH CODE ..., COURSE NAME ...) and the course codes on its
+# first lines. The first ledger of a format is read with the heuristics of result_layouts, and
+# a profile is learned from the first lines of each course code in it: the code's subject and
+# the positions of its tokens (the "*", and the value after each label such as Grd, GP and CP).
+# Ledgers with a known fingerprint are read with the profile: a course line that has exactly
+# the learned shape is stored by position, without looking for its name, its "*" or its
+# labels; any other line, and every course code the profile doesn't know, goes through the
+# heuristics as before.
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+
+from result_layouts import DEFAULT_PROFILE
+from result_parser import LINE_COURSE, LedgerScanner
+
+# Environment setting for the directory of the shared profile store (default: a "profiles"
+# directory in LEDGER_CACHE_DIR, or memory only when neither is set)
+PROFILE_DIR_ENV = "LEDGER_PROFILE_DIR"
+CACHE_DIR_ENV = "LEDGER_CACHE_DIR"
+
+# Lines read before parsing to fingerprint the ledger: a few pages
+FINGERPRINT_LINES = 400
+
+# Page header lines that identify a ledger's format
+FORMAT_PREFIXES = ("BRANCH CODE", "COURSE NAME")
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def _course_codes(lines):
+    codes = set()
+    for line in lines:
+        line = line.strip()
+        if line and LedgerScanner.classify(line)[0] == LINE_COURSE:
+            codes.add(line.split(None, 1)[0])
+    return codes
+
+def ledger_fingerprint(lines):
+    """
+    Return the format fingerprint of a ledger from its first lines, or None without course lines.
+    """
+    headers = []
+    for line in lines:
+        line = " ".join(line.split())
+        if line.startswith(FORMAT_PREFIXES) and line not in headers:
+            headers.append(line)
+    codes = sorted(_course_codes(lines))
+    if not codes:
+        return None
+    text = "\n".join([DEFAULT_PROFILE] + headers + [" ".join(codes)])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def _label_positions(tokens, layout):
+    """
+    Return {field: index of its value} for the label rules of a layout, as its heuristics
+    read them (the last label for "labels", the first for "first_labels"; None when absent).
+    """
+    end = len(tokens) - 1
+    positions = {}
+    for field, label in layout.labels:
+        indexes = [i for i in range(end) if tokens[i] == label]
+        positions[field] = indexes[-1] + 1 if indexes else None
+    for field, label in layout.first_labels:
+        indexes = [i for i in range(end) if tokens[i] == label]
+        positions[field] = indexes[0] + 1 if indexes else None
+    return positions
+
+def learn_profile(fingerprint, samples, layouts):
+    """
+    Learn a LayoutProfile from sample course lines, {course code: [tokens, ...]} (see
+    LedgerScanner's `samples`), read with a result_layouts.LayoutTable. Each code gets the
+    shape (subject, token count and label positions) most of its samples have.
+    """
+    courses = {}
+    for code, lines in samples.items():
+        shapes = Counter()
+        for tokens in lines:
+            subject = " ".join(tokens[1:tokens.index("*")])
+            layout = layouts.lookup(code, subject)
+            if layout is not None:
+                labels = _label_positions(tokens, layout)
+                shapes[(subject, len(tokens), tuple(labels.items()))] += 1
+        if shapes:
+            (subject, n_tokens, labels), _ = shapes.most_common(1)[0]
+            courses[code] = {"subject": subject, "tokens": n_tokens, "labels": dict(labels)}
+    return LayoutProfile(fingerprint, courses)
+
+class LearnedCourse:
+    """
+    A course code of a LayoutProfile compiled for one scanner: checks that a course line has
+    the learned shape and stores it by position.
+    """
+
+    __slots__ = ("name_tokens", "star_index", "n_tokens", "layout", "columns", "code_column", "labels")
+
+    def __init__(self, name_tokens, n_tokens, layout, columns, labels):
+        self.name_tokens = name_tokens
+        self.star_index = len(name_tokens) + 1
+        self.n_tokens = n_tokens
+        self.layout = layout
+        self.columns = columns
+        self.code_column = columns.get(" (Code)")
+        # (label, number of times it must occur, index of its value or None, column)
+        self.labels = labels
+
+    def matches(self, tokens):
+        """
+        Return True when the heuristics would read the line exactly as store() does: same
+        token count and name, "*" in place, and each label once, in place (or absent).
+        """
+        if len(tokens) != self.n_tokens or tokens[self.star_index] != "*" \
+                or tokens[1:self.star_index] != self.name_tokens:
+            return False
+        for label, count, value_index, _ in self.labels:
+            if tokens.count(label) != count or (count and tokens[value_index - 1] != label):
+                return False
+        return True
+
+    def store(self, student, tokens):
+        if self.code_column is not None:
+            student[self.code_column] = tokens[0]
+        self.layout.store_marks(student, self.columns, tokens[self.star_index+1:])
+        for _, count, value_index, column in self.labels:
+            if count:
+                student[column] = tokens[value_index]
+
+class LayoutProfile:
+    """
+    The learned layout of a ledger format: course code -> {"subject", "tokens", "labels"}.
+    """
+
+    def __init__(self, fingerprint, courses):
+        self.fingerprint = fingerprint
+        self.courses = courses
+
+    def compile(self, tokens, subject, layout, columns):
+        """
+        Return the LearnedCourse for the course line `tokens`, read by the scanner as
+        `subject` with `layout` and `columns`, or None when the profile can't read it.
+        """
+        course = self.courses.get(tokens[0])
+        if course is None or course["subject"] != subject or layout is None:
+            return None
+        name_tokens = subject.split(" ") if subject else []
+        if course["tokens"] - len(name_tokens) - 2 < layout.min_marks:
+            return None
+        labels = []
+        for field, label in layout.labels + layout.first_labels:
+            if field not in course["labels"]:
+                return None
+            value_index = course["labels"][field]
+            labels.append((label, 0 if value_index is None else 1, value_index, columns[field]))
+        return LearnedCourse(name_tokens, course["tokens"], layout, columns, tuple(labels))
+
+    def to_dict(self):
+        return {"fingerprint": self.fingerprint, "courses": self.courses}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["fingerprint"], data["courses"])
+
+class ProfileStore:
+    """
+    Learned profiles by fingerprint, kept in memory and, with a directory, as one JSON file each.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._profiles = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, fingerprint):
+        return os.path.join(self.directory, fingerprint + ".json")
+
+    def get(self, fingerprint):
+        """
+        Return the LayoutProfile of a fingerprint, or None.
+        """
+        with self._lock:
+            profile = self._profiles.get(fingerprint)
+        if profile is not None or not self.directory:
+            return profile
+        try:
+            with open(self._path(fingerprint), encoding="utf-8") as f:
+                profile = LayoutProfile.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            self._profiles[fingerprint] = profile
+        return profile
+
+    def put(self, profile):
+        with self._lock:
+            self._profiles[profile.fingerprint] = profile
+        if self.directory:
+            # Written under a temporary name first, so readers never see a partial file
+            path = self._path(profile.fingerprint)
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                json.dump(profile.to_dict(), f, indent=1)
+            os.replace(temporary, path)
+
+def get_profile_store():
+    """
+    Return the process-wide profile store (see PROFILE_DIR_ENV).
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            directory = os.environ.get(PROFILE_DIR_ENV)
+            if not directory and os.environ.get(CACHE_DIR_ENV):
+                directory = os.path.join(os.environ[CACHE_DIR_ENV], "profiles")
+            _default_store = ProfileStore(directory or None)
+        return _default_store
@@ -0,0 +1,430 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from itertools import islice
+
+from result_table import StudentTable
+
+# Per-student columns of a parsed ledger and the students-table columns they are stored in.
+# Every other column is a subject column and goes to the long marks table.
+STUDENT_COLUMNS = {
+    "Seat No.": "seat_no",
+    "PRN": "prn",
+    "Name of Student": "name",
+    "Mother's Name": "mother",
+    "College Code": "college_code",
+    "SGPA": "sgpa",
+    "Total Credits": "total_credits",
+    "CGPA": "cgpa",
+    "Total": "total",
+    "%": "percent",
+    "Result": "result",
+}
+NUMERIC_COLUMNS = {"sgpa": float, "total_credits": int, "cgpa": float, "total": int, "percent": float}
+
+# Rows handed to one executemany() call; a ledger is still stored in a single transaction
+BATCH_ROWS = 10000
+
+# Tables, then indexes (created after _migrate has added any missing columns)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledgers (
+    id INTEGER PRIMARY KEY,
+    ledger_key TEXT UNIQUE,
+    source TEXT,
+    label TEXT,
+    imported_at TEXT,
+    students INTEGER
+);
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY,
+    ledger_id INTEGER NOT NULL REFERENCES ledgers(id) ON DELETE CASCADE,
+    seat_no TEXT,
+    prn TEXT,
+    name TEXT,
+    mother TEXT,
+    college_code TEXT,
+    sgpa REAL,
+    total_credits INTEGER,
+    cgpa REAL,
+    total INTEGER,
+    percent REAL,
+    result TEXT,
+    student_key TEXT,
+    fingerprint TEXT
+);
+CREATE TABLE IF NOT EXISTS marks (
+    student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT,
+    mark INTEGER,
+    max_marks INTEGER
+);
+CREATE TABLE IF NOT EXISTS ledger_pages (
+    ledger_id INTEGER NOT NULL REFERENCES ledgers(id) ON DELETE CASCADE,
+    content_hash TEXT NOT NULL,
+    student_keys TEXT,
+    PRIMARY KEY (ledger_id, content_hash)
+);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS students_prn ON students(prn);
+CREATE INDEX IF NOT EXISTS students_seat_no ON students(seat_no);
+CREATE INDEX IF NOT EXISTS students_college_code ON students(college_code);
+CREATE INDEX IF NOT EXISTS students_ledger ON students(ledger_id, student_key);
+CREATE INDEX IF NOT EXISTS marks_student ON marks(student_id);
+CREATE INDEX IF NOT EXISTS marks_subject ON marks(subject, field);
+"""
+
+def split_column(name):
+    """
+    Split a subject column into (subject, field): "DBMS (Total)" -> ("DBMS", "Total").
+    A column without a field, such as "MOOC", gives (name, "").
+    """
+    if name.endswith(")"):
+        subject, sep, field = name.rpartition(" (")
+        if sep:
+            return subject, field[:-1]
+    return name, ""
+
+def _number(value, kind):
+    """
+    Convert a ledger value to int/float, or None for blanks, "-", AB, FF and the like.
+    """
+    if value is None:
+        return None
+    try:
+        return kind(value)
+    except ValueError:
+        return None
+
+def student_key(record):
+    """
+    Return the key a student is matched on between ledgers: the PRN, or the seat number
+    when the PRN is missing.
+    """
+    return _key(record.get("PRN"), record.get("Seat No.", "-"))
+
+def _key(prn, seat_no):
+    return prn if prn and prn != "-" else seat_no
+
+def record_values(record):
+    """
+    Return a student dictionary's values as the database stores them: {column: value} with
+    typed student columns (SGPA as a float, ...) and (value, maximum) for subject columns.
+    Missing values ("-", blanks) are left out.
+    """
+    values = {}
+    max_marks = getattr(record, "max_marks", {})
+    for name, value in record.items():
+        if value is None or value == "-" or value == "":
+            continue
+        column = STUDENT_COLUMNS.get(name)
+        if column is None:
+            values[name] = (value, _number(max_marks.get(name), int))
+            continue
+        kind = NUMERIC_COLUMNS.get(column)
+        if kind is not None:
+            value = _number(value, kind)
+            if value is None:
+                continue
+        values[name] = value
+    return values
+
+def fingerprint(values):
+    """
+    Return a short hex digest of record_values() output, independent of column order.
+    """
+    return hashlib.blake2b(repr(sorted(values.items())).encode(), digest_size=16).hexdigest()
+
+def _batches(rows, size=BATCH_ROWS):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+class StudentStore:
+    """
+    SQLite database of parsed students across ledgers and semesters.
+
+    Each stored ledger is a row in `ledgers`; its students go to `students` (one row per
+    student, indexed by PRN, seat number and college code) and their subject marks to the
+    long table `marks` (one row per student, subject and field, indexed by subject). Storing
+    a ledger is a single transaction, so a failed import leaves nothing behind, and storing
+    the same ledger (same ledger_key) again replaces it.
+
+    Every student also gets its student_key() and a fingerprint of its values, and a ledger
+    can keep the content hashes of the PDF pages it was read from (`ledger_pages`), so later
+    ledgers can be applied incrementally (see result_incremental).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+        self.connection.executescript(INDEXES)
+
+    def _migrate(self):
+        # Databases written before students had keys and fingerprints
+        existing = {row["name"] for row in self.connection.execute("PRAGMA table_info(students)")}
+        with self.connection:
+            for column in ("student_key", "fingerprint"):
+                if column not in existing:
+                    self.connection.execute(f"ALTER TABLE students ADD COLUMN {column} TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add_ledger(self, students, source="", label="", ledger_key=None):
+        """
+        Store the parsed students of one ledger (a StudentTable or a list of student
+        dictionaries) and return the new ledger id. label names the ledger for queries,
+        e.g. "BE IT Dec 2023"; ledger_key (see result_cache.ledger_key) identifies the file.
+        """
+        if not isinstance(students, StudentTable):
+            students = StudentTable.from_records(students)
+        with self.connection:
+            if ledger_key is not None:
+                self.connection.execute("DELETE FROM ledgers WHERE ledger_key = ?", (ledger_key,))
+            ledger_id = self._new_ledger(source, label, ledger_key)
+            self._insert_students(ledger_id, students)
+        return ledger_id
+
+    def _new_ledger(self, source, label, ledger_key=None):
+        cursor = self.connection.execute(
+            "INSERT INTO ledgers (ledger_key, source, label, imported_at, students) VALUES (?, ?, ?, ?, 0)",
+            (ledger_key, source, label, time.strftime("%Y-%m-%d %H:%M:%S")),
+        )
+        return cursor.lastrowid
+
+    def _insert_students(self, ledger_id, students, ids=None):
+        """
+        Insert the rows of a StudentTable under the given student ids (new ids when None),
+        in batches, inside the caller's transaction.
+        """
+        if ids is None:
+            # Student ids are assigned here so the marks can refer to them without reading them back
+            first_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM students").fetchone()[0]
+            ids = range(first_id, first_id + len(students))
+
+        columns = list(STUDENT_COLUMNS.values())
+        values = []
+        for name, column in STUDENT_COLUMNS.items():
+            column_values = students.column(name)
+            kind = NUMERIC_COLUMNS.get(column)
+            if kind is not None:
+                column_values = [_number(value, kind) for value in column_values]
+            values.append(column_values)
+        values.append([_key(prn, seat_no) for prn, seat_no in students.iter_rows(["PRN", "Seat No."])])
+        values.append([fingerprint(record_values(record)) for record in students.records()])
+        columns += ["student_key", "fingerprint"]
+        rows = ((student_id, ledger_id) + row for student_id, row in zip(ids, zip(*values)))
+        sql = (f"INSERT INTO students (id, ledger_id, {', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * (len(columns) + 2))})")
+        for batch in _batches(rows):
+            self.connection.executemany(sql, batch)
+
+        for batch in _batches(self._mark_rows(students, ids)):
+            self.connection.executemany(
+                "INSERT INTO marks (student_id, subject, field, value, mark, max_marks) VALUES (?, ?, ?, ?, ?, ?)",
+                batch,
+            )
+        self.connection.execute(
+            "UPDATE ledgers SET students = (SELECT COUNT(*) FROM students WHERE ledger_id = ?) WHERE id = ?",
+            (ledger_id, ledger_id),
+        )
+
+    def _mark_rows(self, students, ids):
+        # One row per student and subject column, skipping students without a value
+        for name in students.columns:
+            if name in STUDENT_COLUMNS:
+                continue
+            subject, field = split_column(name)
+            numeric = field != "Code"
+            maxima = students.max_marks_column(name)
+            for student_id, value, maximum in zip(ids, students.column(name), maxima):
+                if value is None or value == "-" or value == "":
+                    continue
+                mark = _number(value, int) if numeric else None
+                yield student_id, subject, field, value, mark, _number(maximum, int)
+
+    def apply_changes(self, ledger_id, students, ids, page_keys=None, source="", label=""):
+        """
+        Apply an incremental update in one transaction and return the ledger id.
+
+        students is a StudentTable of new and changed students; ids gives, per row, the id of
+        the stored student it replaces, or None for a new student. With ledger_id None a new
+        ledger is created. page_keys maps page content hashes to the keys of the students
+        found on those pages (see page_index).
+        """
+        with self.connection:
+            if ledger_id is None:
+                ledger_id = self._new_ledger(source, label)
+            replaced = [(student_id,) for student_id in ids if student_id is not None]
+            # Deleting a student also deletes its marks (ON DELETE CASCADE)
+            self.connection.executemany("DELETE FROM students WHERE id = ?", replaced)
+            next_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM students").fetchone()[0]
+            assigned = []
+            for student_id in ids:
+                if student_id is None:
+                    student_id = next_id
+                    next_id += 1
+                assigned.append(student_id)
+            self._insert_students(ledger_id, students, assigned)
+            if page_keys:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO ledger_pages (ledger_id, content_hash, student_keys) VALUES (?, ?, ?)",
+                    [(ledger_id, content_hash, "\n".join(keys)) for content_hash, keys in page_keys.items()],
+                )
+        return ledger_id
+
+    def find_ledger(self, label):
+        """
+        Return the id of the most recently stored ledger with this label, or None.
+        """
+        row = self.connection.execute(
+            "SELECT id FROM ledgers WHERE label = ? ORDER BY id DESC LIMIT 1", (label,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def page_index(self, ledger_id):
+        """
+        Return {page content hash: [student keys on that page]} for the pages stored with a ledger.
+        """
+        rows = self.connection.execute(
+            "SELECT content_hash, student_keys FROM ledger_pages WHERE ledger_id = ?", (ledger_id,)
+        )
+        return {content_hash: keys.split("\n") if keys else [] for content_hash, keys in rows}
+
+    def fingerprints(self, ledger_id):
+        """
+        Return {student key: (student id, fingerprint)} for the students of a ledger.
+        """
+        rows = self.connection.execute(
+            "SELECT student_key, id, fingerprint FROM students WHERE ledger_id = ? ORDER BY id", (ledger_id,)
+        )
+        return {key: (student_id, value) for key, student_id, value in rows}
+
+    def student_values(self, student_ids):
+        """
+        Return {student id: values} for stored students, in the form of record_values().
+        """
+        names = {column: name for name, column in STUDENT_COLUMNS.items()}
+        result = {}
+        for student_id in student_ids:
+            row = self.connection.execute("SELECT * FROM students WHERE id = ?", (student_id,)).fetchone()
+            if row is None:
+                continue
+            values = {names[column]: row[column] for column in names
+                      if row[column] is not None and row[column] != "-" and row[column] != ""}
+            for subject, field, value, maximum in self.connection.execute(
+                    "SELECT subject, field, value, max_marks FROM marks WHERE student_id = ?", (student_id,)):
+                values[f"{subject} ({field})" if field else subject] = (value, maximum)
+            result[student_id] = values
+        return result
+
+    def remove_ledger(self, ledger_id):
+        with self.connection:
+            self.connection.execute("DELETE FROM ledgers WHERE id = ?", (ledger_id,))
+
+    def ledgers(self):
+        """
+        Return every stored ledger as a dict, oldest first.
+        """
+        return [dict(row) for row in self.connection.execute("SELECT * FROM ledgers ORDER BY id")]
+
+    def find_students(self, prn=None, seat_no=None, college_code=None, ledger_id=None):
+        """
+        Return the students matching every given criterion, across all stored ledgers, as
+        dicts that also carry the ledger's label and source.
+        """
+        conditions = []
+        parameters = []
+        for column, value in (("prn", prn), ("seat_no", seat_no), ("college_code", college_code),
+                              ("ledger_id", ledger_id)):
+            if value is not None:
+                conditions.append(f"s.{column} = ?")
+                parameters.append(value)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        rows = self.connection.execute(
+            "SELECT s.*, l.label, l.source FROM students s JOIN ledgers l ON l.id = s.ledger_id"
+            + where + " ORDER BY s.ledger_id, s.id",
+            parameters,
+        )
+        return [dict(row) for row in rows]
+
+    def student_marks(self, student_id):
+        """
+        Return the subject marks of one student as dicts (subject, field, value, mark, max_marks).
+        """
+        rows = self.connection.execute(
+            "SELECT subject, field, value, mark, max_marks FROM marks WHERE student_id = ? ORDER BY rowid",
+            (student_id,),
+        )
+        return [dict(row) for row in rows]
+
+    def subject_marks(self, subject, field="Total", college_code=None):
+        """
+        Return one field of a subject for every student who has it, across all ledgers.
+        """
+        sql = ("SELECT l.label, s.seat_no, s.prn, s.name, s.college_code, m.value, m.mark, m.max_marks "
+               "FROM marks m JOIN students s ON s.id = m.student_id JOIN ledgers l ON l.id = s.ledger_id "
+               "WHERE m.subject = ? AND m.field = ?")
+        parameters = [subject, field]
+        if college_code is not None:
+            sql += " AND s.college_code = ?"
+            parameters.append(college_code)
+        return [dict(row) for row in self.connection.execute(sql + " ORDER BY s.id", parameters)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up students in a result database.")
+    parser.add_argument("database", help="SQLite file written by result_cli.py --db")
+    parser.add_argument("--prn", help="students with this PRN")
+    parser.add_argument("--seat", help="students with this seat number")
+    parser.add_argument("--college", help="students of this college code")
+    parser.add_argument("--marks", action="store_true", help="also print each student's subject marks")
+    parser.add_argument("--ledgers", action="store_true", help="list the stored ledgers")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.database):
+        print(f"No database at {args.database}", file=sys.stderr)
+        return 2
+    with StudentStore(args.database) as store:
+        if args.ledgers:
+            for ledger in store.ledgers():
+                print(f"{ledger['id']:>4}  {ledger['students']:>7} students  {ledger['label'] or '-'}  "
+                      f"{ledger['source']}  ({ledger['imported_at']})")
+        if args.prn is None and args.seat is None and args.college is None:
+            return 0
+        students = store.find_students(prn=args.prn, seat_no=args.seat, college_code=args.college)
+        for student in students:
+            print(f"{student['label'] or student['source']}: {student['seat_no']} {student['prn']} "
+                  f"{student['name']} (CLG {student['college_code']}) SGPA {student['sgpa']}")
+            if args.marks:
+                for mark in store.student_marks(student["id"]):
+                    maximum = f"/{mark['max_marks']}" if mark["max_marks"] is not None else ""
+                    print(f"    {mark['subject']} {mark['field']}: {mark['value']}{maximum}")
+        if not students:
+            print("No matching students.", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+import sys
+from itertools import compress, repeat
+from operator import is_not
+
+class StudentRecord(dict):
+    """
+    A student dictionary that also keeps the maximum marks printed for its mark columns
+    (e.g. "100" for "062/100") in self.max_marks, keyed by column name, and the ledger page
+    its header was printed on in self.page (None where unknown).
+    """
+    __slots__ = ("max_marks", "page")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_marks = {}
+        self.page = None
+
+class StudentTable:
+    """
+    Columnar store for parsed student records.
+
+    Each column name is interned and stored once in self.columns (in order of first
+    appearance). A column's values are kept in a single list, one slot per student, with
+    None where the student has no value. Repeated values such as marks, grades and course
+    codes are shared through a value pool instead of being stored once per student.
+    The maximum marks of StudentRecord rows are kept the same way, per mark column, and
+    their pages in one list that isn't a column (so it is never exported).
+    """
+
+    def __init__(self):
+        self.columns = []
+        self._index = {}
+        self._data = []
+        self._max_marks = {}
+        self._pages = []
+        self._values = {}
+        self._rows = 0
+        self._shapes = {}
+        self._last_shape = None
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build a table from an iterable of student dictionaries, consuming it one record at a time.
+        """
+        table = cls()
+        for record in records:
+            table.append(record)
+        return table
+
+    def __len__(self):
+        return self._rows
+
+    def __iter__(self):
+        return self.records()
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def append(self, record):
+        """
+        Add one student dictionary as a new row.
+        """
+        row = self._rows
+        pool = self._values
+        # Records of a ledger come in a few shapes (tuples of column names), so the column
+        # lists of each shape are looked up once; a row with the shape of the previous row
+        # needs no padding, since each of its columns holds a value for every row before it
+        shape = tuple(record)
+        lists = self._shapes.get(shape)
+        if lists is None:
+            lists = self._shapes[shape] = [self._data[self._position(name)] for name in shape]
+        if shape != self._last_shape:
+            for values in lists:
+                if len(values) < row:
+                    values.extend([None] * (row - len(values)))
+            self._last_shape = shape
+        for values, value in zip(lists, record.values()):
+            values.append(pool.setdefault(value, value) if isinstance(value, str) else value)
+        for name, maximum in getattr(record, "max_marks", {}).items():
+            values = self._max_marks.setdefault(self._index[name], [])
+            if len(values) < row:
+                values.extend([None] * (row - len(values)))
+            values.append(pool.setdefault(maximum, maximum))
+        self._pages.append(getattr(record, "page", None))
+        self._rows = row + 1
+
+    def _position(self, name):
+        position = self._index.get(name)
+        if position is None:
+            position = self._add_column(name)
+        return position
+
+    def _add_column(self, name):
+        name = sys.intern(name)
+        position = len(self.columns)
+        self.columns.append(name)
+        self._index[name] = position
+        self._data.append([])
+        return position
+
+    def _padded(self, position, values=None):
+        # Columns are only extended when written, so fill the tail up to the current row count
+        if values is None:
+            values = self._data[position]
+        if len(values) < self._rows:
+            values.extend([None] * (self._rows - len(values)))
+        return values
+
+    def column(self, name, fill=None, rows=None):
+        """
+        Return the values of one column as a list with one entry per student (or for the
+        first `rows` students). Missing values (and unknown columns) are returned as `fill`.
+        """
+        count = self._rows if rows is None else min(rows, self._rows)
+        position = self._index.get(name)
+        if position is None:
+            return [fill] * count
+        values = self._padded(position)
+        if count < self._rows:
+            values = values[:count]
+        if fill is None:
+            return list(values)
+        return [fill if value is None else value for value in values]
+
+    def select(self, columns):
+        """
+        Return a table with only the given columns (those this table has), in that order.
+        The column lists are shared with this table, not copied, so the result is for reading.
+        """
+        table = StudentTable()
+        table._values = self._values
+        table._pages = self._pages
+        table._rows = self._rows
+        for name in columns:
+            position = self._index.get(name)
+            if position is None or name in table._index:
+                continue
+            new_position = len(table.columns)
+            table.columns.append(name)
+            table._index[name] = new_position
+            table._data.append(self._padded(position))
+            if position in self._max_marks:
+                table._max_marks[new_position] = self._padded(position, self._max_marks[position])
+        return table
+
+    def take(self, rows):
+        """
+        Return a table with only the given rows (indexes into this table), in that order, and
+        only the columns that have a value in one of them. Values are shared, not copied.
+        """
+        table = StudentTable()
+        table._values = self._values
+        table._pages = [self._pages[row] for row in rows]
+        table._rows = len(rows)
+        for position, name in enumerate(self.columns):
+            values = self._padded(position)
+            taken = [values[row] for row in rows]
+            if taken.count(None) == len(taken):
+                continue
+            new_position = len(table.columns)
+            table.columns.append(name)
+            table._index[name] = new_position
+            table._data.append(taken)
+            if position in self._max_marks:
+                maxima = self._padded(position, self._max_marks[position])
+                table._max_marks[new_position] = [maxima[row] for row in rows]
+        return table
+
+    def page_column(self):
+        """
+        Return the ledger page of each student (None where unknown).
+        """
+        return list(self._pages)
+
+    def max_marks_column(self, name):
+        """
+        Return the maximum marks recorded for a column (None where unknown), one entry per student.
+        """
+        position = self._index.get(name)
+        if position is None or position not in self._max_marks:
+            return [None] * self._rows
+        return list(self._padded(position, self._max_marks[position]))
+
+    def set_column(self, name, values):
+        """
+        Replace (or add) a whole column with one value per student.
+        """
+        if len(values) != self._rows:
+            raise ValueError(f"Column {name!r} has {len(values)} values for {self._rows} students")
+        position = self._index.get(name)
+        if position is None:
+            position = self._add_column(name)
+        pool = self._values
+        self._data[position] = [pool.setdefault(value, value) if isinstance(value, str) else value
+                                for value in values]
+        # The column list was replaced, so the lists cached by append() are stale
+        self._shapes.clear()
+        self._last_shape = None
+
+    def iter_rows(self, columns, fill=None):
+        """
+        Yield one tuple of values per student for the given columns, without copying the columns.
+        """
+        lists = []
+        for name in columns:
+            position = self._index.get(name)
+            if position is None:
+                lists.append(repeat(None, self._rows))
+                continue
+            lists.append(self._padded(position))
+        for row in zip(*lists):
+            if None in row:
+                row = tuple(fill if value is None else value for value in row)
+            yield row
+
+    def records(self):
+        """
+        Yield each row as a StudentRecord holding only the columns the student has values for.
+        """
+        # Rows are read across the column lists with zip, and each record is built from the
+        # (name, value) pairs whose value isn't None, rather than column by column
+        columns = self.columns
+        lists = [self._padded(position) for position in range(len(columns))]
+        mark_columns = [columns[position] for position in self._max_marks]
+        maxima_lists = [self._padded(position, values) for position, values in self._max_marks.items()]
+        rows = zip(*lists) if lists else repeat((), self._rows)
+        maxima_rows = zip(*maxima_lists) if maxima_lists else repeat((), self._rows)
+        for values, maxima, page in zip(rows, maxima_rows, self._pages):
+            record = StudentRecord(compress(zip(columns, values), map(is_not, values, repeat(None))))
+            record.page = page
+            if maxima:
+                record.max_marks.update(compress(zip(mark_columns, maxima), map(is_not, maxima, repeat(None))))
+            yield record
+
+    def to_dataframe(self, columns=None, fill="-", rows=None):
+        """
+        Build a DataFrame straight from the column lists, in the given column order.
+        With rows, only the first `rows` students are included (e.g. for previews).
+        """
+        import pandas as pd
+        if columns is None:
+            columns = self.columns
+        return pd.DataFrame({name: self.column(name, fill, rows) for name in columns}, columns=columns)
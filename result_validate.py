@@ -0,0 +1,131 @@
+import json
+import numpy as np
+from result_marks import MARK_FIELDS, field_of, numeric_marks
+from result_metrics import stage
+from result_parser import SUBJECT_FIELDS
+
+# Consistency checks, in report order:
+#   insem_ese_total: a subject's Insem + ESE isn't its Total
+#   above_maximum:   a mark is above the maximum printed with it ("/030", "/100", ...)
+#   sgpa_range:      SGPA isn't a number from 0 to 10 (or "--" for no SGPA)
+#   no_courses:      a student without any course line
+CHECKS = ("insem_ese_total", "above_maximum", "sgpa_range", "no_courses")
+
+# The checks that hold when only some subjects or fields were extracted (see
+# result_parser.LedgerScanner): a student whose course lines were all left out has none
+PROJECTED_CHECKS = ("insem_ese_total", "above_maximum", "sgpa_range")
+
+SGPA_MIN = 0.0
+SGPA_MAX = 10.0
+# SGPA values meaning "no SGPA", which aren't anomalies
+SGPA_BLANKS = ["-", "--", ""]
+
+# Columns of an anomaly; reports written by write_anomaly_report start with "Source"
+ANOMALY_COLUMNS = ["Seat No.", "PRN", "Name of Student", "Page", "Check", "Column", "Value", "Detail"]
+REPORT_COLUMNS = ["Source"] + ANOMALY_COLUMNS
+
+def _subject_columns(students, field):
+    """
+    Return {subject: column} for every column of the given field.
+    """
+    return {column[:-len(field)]: column for column in students.columns if column.endswith(field)}
+
+def _insem_ese_total(students):
+    insem = _subject_columns(students, " (Insem)")
+    ese = _subject_columns(students, " (ESE)")
+    for subject, total_column in _subject_columns(students, " (Total)").items():
+        if subject not in insem or subject not in ese:
+            continue
+        parts = numeric_marks(students.column(insem[subject])) + numeric_marks(students.column(ese[subject]))
+        raw_total = students.column(total_column)
+        total = numeric_marks(raw_total)
+        # NaN (AB, FF, a missing mark) compares unequal but also fails isfinite, so it isn't flagged
+        for row in np.flatnonzero(np.isfinite(parts) & np.isfinite(total) & (parts != total)):
+            yield row, total_column, raw_total[row], f"Insem + ESE = {parts[row]:g}"
+
+def _above_maximum(students):
+    for column in students.columns:
+        if field_of(column) not in MARK_FIELDS:
+            continue
+        raw = students.column(column)
+        raw_maxima = students.max_marks_column(column)
+        # Comparisons with NaN are False, so marks without a number or a printed maximum pass
+        for row in np.flatnonzero(numeric_marks(raw) > numeric_marks(raw_maxima)):
+            yield row, column, raw[row], f"maximum is {raw_maxima[row]}"
+
+def _sgpa_range(students):
+    raw = students.column("SGPA", "-")
+    sgpa = numeric_marks(raw)
+    with np.errstate(invalid="ignore"):
+        out_of_range = (sgpa < SGPA_MIN) | (sgpa > SGPA_MAX)
+    unreadable = np.isnan(sgpa) & ~np.isin(np.asarray(raw, dtype=object), SGPA_BLANKS)
+    for row in np.flatnonzero(out_of_range | unreadable):
+        yield row, "SGPA", raw[row], f"SGPA must be a number from {SGPA_MIN:g} to {SGPA_MAX:g}"
+
+def _no_courses(students):
+    # Every stored course line has a (Code); without those (see LedgerScanner's fields), any subject field counts
+    columns = [column for column in students.columns if column.endswith(" (Code)")] \
+        or [column for column in students.columns if column.endswith(SUBJECT_FIELDS)]
+    has_courses = np.zeros(len(students), dtype=bool)
+    for column in columns:
+        has_courses |= np.asarray(students.column(column), dtype=object) != None  # noqa: E711 (elementwise)
+    for row in np.flatnonzero(~has_courses):
+        yield row, "", "", "no course lines were read for this student"
+
+CHECK_FUNCTIONS = {
+    "insem_ese_total": _insem_ese_total,
+    "above_maximum": _above_maximum,
+    "sgpa_range": _sgpa_range,
+    "no_courses": _no_courses,
+}
+
+def validate_students(students, source=None, stats=None, checks=CHECKS):
+    """
+    Run the checks (CHECKS by default, PROJECTED_CHECKS for projected tables) over a
+    StudentTable and return its anomalies as a list of dicts (ANOMALY_COLUMNS, plus
+    "Source" when source is given), ordered by student.
+
+    Each check works column by column with numpy over the whole cohort, so only the flagged
+    students are looked at one by one. With a result_metrics.PipelineStats, the time is
+    recorded as the "validate" stage and the number found as the "anomalies" counter.
+    """
+    with stage(stats, "validate"):
+        found = []
+        for order, check in enumerate(checks):
+            for row, column, value, detail in CHECK_FUNCTIONS[check](students):
+                found.append((int(row), order, check, column, value, detail))
+        found.sort(key=lambda anomaly: anomaly[:2])
+
+        identity = {name: students.column(name, "-") for name in ("Seat No.", "PRN", "Name of Student")}
+        pages = students.page_column()
+        anomalies = []
+        for row, _, check, column, value, detail in found:
+            anomaly = {} if source is None else {"Source": source}
+            for name, values in identity.items():
+                anomaly[name] = values[row]
+            anomaly.update({"Page": pages[row], "Check": check, "Column": column, "Value": value, "Detail": detail})
+            anomalies.append(anomaly)
+    if stats is not None:
+        stats.count("anomalies", len(anomalies))
+    return anomalies
+
+# Report format -> writer(DataFrame, output)
+ANOMALY_WRITERS = {
+    "xlsx": lambda frame, output: frame.to_excel(output, index=False, sheet_name="Anomalies"),
+    "csv": lambda frame, output: frame.to_csv(output, index=False),
+    "parquet": lambda frame, output: frame.to_parquet(output, index=False),
+    "arrow": lambda frame, output: frame.to_feather(output),
+}
+
+def write_anomaly_report(anomalies, output):
+    """
+    Write anomalies to `output`: JSON for a .json path, otherwise a table in the format
+    of the extension (xlsx by default, see result_export.format_from_path).
+    """
+    if str(output).lower().endswith(".json"):
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"anomalies": len(anomalies), "rows": anomalies}, f, indent=2)
+        return
+    import pandas as pd
+    from result_export import format_from_path
+    ANOMALY_WRITERS[format_from_path(output)](pd.DataFrame(anomalies, columns=REPORT_COLUMNS), output)